@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Minify and fingerprint the stylesheet and script of a built site and inline the critical CSS
+"""
+
+import argparse
+import hashlib
+import re
+from pathlib import Path
+
+from site_tree import find_html_files
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build'
+HEADERS_FILENAME = '_headers'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Hex digits of the content hash in a fingerprinted name, e.g. style.0123456789.css
+FINGERPRINT_LENGTH = 10
+
+# --- CSS -------------------------------------------------------------------
+
+CSS_PROTECTED = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\([^)]*\)')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+CSS_SPACE_AFTER = re.compile(r'(\()\s+')
+# Whitespace around a colon only goes inside declaration blocks and at-rule
+# features like (max-width: 600px): in a selector "a :hover" is a descendant,
+# not "a:hover"
+CSS_DECLARATIONS = re.compile(r'(?<=[{;])[^{};]+(?=[;}])')
+CSS_COLON = re.compile(r'\s*:\s*')
+CSS_AT_PRELUDE = re.compile(r'@[^{};]+')
+CSS_FEATURE = re.compile(r'(\([\w-]+)\s*:\s*')
+CSS_SPACE_BEFORE = re.compile(r'\s+([)])')
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace; strings and url() are left untouched"""
+    protected = []
+
+    def protect(match):
+        protected.append(match.group(0))
+        return f'\0{len(protected) - 1}\0'
+
+    css = CSS_COMMENT.sub('', CSS_PROTECTED.sub(protect, css))
+    css = re.sub(r'\s+', ' ', css)
+    css = CSS_SPACE_AROUND.sub(r'\1', css)
+    css = CSS_SPACE_AFTER.sub(r'\1', css)
+    css = CSS_DECLARATIONS.sub(lambda match: CSS_COLON.sub(':', match.group(0)), css)
+    css = CSS_AT_PRELUDE.sub(lambda match: CSS_FEATURE.sub(r'\1:', match.group(0)), css)
+    css = CSS_SPACE_BEFORE.sub(r'\1', css)
+    css = css.replace(';}', '}').strip()
+    return re.sub(r'\0(\d+)\0', lambda match: protected[int(match.group(1))], css)
+
+def split_rules(css):
+    """Top-level (prelude, body) pairs of minified CSS; statements like @import have body None"""
+    rules = []
+    start = 0
+    depth = 0
+    parens = 0
+    quote = None
+    pos = 0
+    while pos < len(css):
+        char = css[pos]
+        if quote:
+            if char == '\\':
+                pos += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '(':
+            parens += 1
+        elif char == ')':
+            parens -= 1
+        elif parens:
+            pass
+        elif char == ';' and depth == 0:
+            rules.append((css[start:pos], None))
+            start = pos + 1
+        elif char == '{':
+            if depth == 0:
+                brace = pos
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((css[start:brace], css[brace + 1:pos]))
+                start = pos + 1
+        pos += 1
+    if css[start:].strip():
+        rules.append((css[start:], None))
+    return rules
+
+SELECTOR_PSEUDO = re.compile(r'::?[\w-]+(?:\([^)]*\))?|\[[^\]]*\]')
+SELECTOR_CLASS = re.compile(r'\.([\w-]+)')
+SELECTOR_ID = re.compile(r'#([\w-]+)')
+SELECTOR_TAG = re.compile(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)')
+
+def selector_matches(selector, tokens):
+    """Whether every class, id and tag a selector needs is present in the page"""
+    classes, ids, tags = tokens
+    bare = SELECTOR_PSEUDO.sub('', selector)
+    if not bare.strip(' *'):
+        return True
+    return (all(name in classes for name in SELECTOR_CLASS.findall(bare))
+            and all(name in ids for name in SELECTOR_ID.findall(bare))
+            and all(name.lower() in tags for name in SELECTOR_TAG.findall(bare)))
+
+def critical_css(css, tokens):
+    """Rules from minified CSS that can apply to markup with these tokens"""
+    kept = []
+    keyframes = []
+    for prelude, body in split_rules(css):
+        if body is None:
+            continue
+        if prelude.startswith('@keyframes'):
+            keyframes.append((prelude, body))
+        elif prelude.startswith('@media'):
+            inner = critical_css(body, tokens)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+        elif not prelude.startswith('@'):
+            if any(selector_matches(selector, tokens) for selector in prelude.split(',')):
+                kept.append(f'{prelude}{{{body}}}')
+    text = ''.join(kept)
+    for prelude, body in keyframes:
+        if prelude.split()[-1] in text:
+            text += f'{prelude}{{{body}}}'
+    return text
+
+# --- JavaScript -------------------------------------------------------------
+
+def minify_js(js):
+    """Drop whole-line comments, indentation and blank lines; line breaks stay, so ASI is unaffected"""
+    lines = []
+    in_block_comment = False
+    in_template = False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+            in_template = line.count('`') % 2 == 0
+            continue
+        stripped = line.strip()
+        if in_block_comment:
+            in_block_comment = '*/' not in stripped
+            continue
+        if stripped.startswith('/*'):
+            in_block_comment = '*/' not in stripped
+            continue
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+        in_template = stripped.count('`') % 2 == 1
+    return '\n'.join(lines) + '\n'
+
+# --- Pages ------------------------------------------------------------------
+
+# Fingerprinted assets and their minifiers, by path relative to the site root
+ASSETS = {
+    'css/style.css': minify_css,
+    'js/main.js': minify_js,
+}
+STYLESHEET = 'css/style.css'
+
+ASSET_REFERENCE = re.compile(
+    r'<link rel="stylesheet" href="([^"]*?)(' + re.escape(STYLESHEET) + r')">'
+    r'|<script src="([^"]*?)(' + '|'.join(re.escape(path) for path in ASSETS if path != STYLESHEET) + r')"'
+)
+
+CLASS_ATTR = re.compile(r'\bclass="([^"]*)"')
+ID_ATTR = re.compile(r'\bid="([^"]*)"')
+TAG_NAME = re.compile(r'<([a-zA-Z][\w-]*)')
+
+def above_the_fold(content):
+    """Markup shown before any scrolling: everything up to the end of the first section after the header"""
+    header_end = content.find('</header>')
+    if header_end < 0:
+        return content[:content.find('<main') if '<main' in content else len(content)]
+    section_end = content.find('</section>', header_end)
+    return content[:section_end if section_end >= 0 else header_end]
+
+def markup_tokens(markup):
+    """(classes, ids, tags) used in markup"""
+    classes = {name for value in CLASS_ATTR.findall(markup) for name in value.split()}
+    ids = set(ID_ATTR.findall(markup))
+    tags = {name.lower() for name in TAG_NAME.findall(markup)} | {'html', 'body'}
+    return classes, ids, tags
+
+def fingerprint_assets(output_dir):
+    """Write minified, content-hashed copies of ASSETS; returns {path: (hashed path, minified text)}"""
+    assets = {}
+    for path, minify in ASSETS.items():
+        source = output_dir / path
+        if not source.exists():
+            continue
+        text = minify(source.read_text(encoding='utf-8'))
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:FINGERPRINT_LENGTH]
+        stem, suffix = path.rsplit('.', 1)
+        hashed = f'{stem}.{digest}.{suffix}'
+        # Only earlier fingerprints go, never a hand-written sibling like style.print.css
+        fingerprinted = re.compile(rf'{re.escape(Path(stem).name)}\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}\.{re.escape(suffix)}')
+        for stale in source.parent.glob(f'{Path(stem).name}.*.{suffix}'):
+            if fingerprinted.fullmatch(stale.name) and stale.name != Path(hashed).name:
+                stale.unlink()
+        target = output_dir / hashed
+        if not target.exists():
+            target.write_text(text, encoding='utf-8')
+        assets[path] = (hashed, text)
+    return assets
+
+def rewrite_references(content, assets, critical):
+    """Point stylesheet and script tags at the hashed files and inline the critical CSS, in one pass"""
+    def replace(match):
+        if match.group(2):
+            prefix, path = match.group(1), match.group(2)
+        else:
+            prefix, path = match.group(3), match.group(4)
+        if path not in assets:
+            return match.group(0)
+        href = prefix + assets[path][0]
+        if path != STYLESHEET:
+            return f'<script src="{href}"'
+        return (f'<style>{critical}</style>'
+                f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+                f'<noscript><link rel="stylesheet" href="{href}"></noscript>')
+
+    return ASSET_REFERENCE.sub(replace, content)
+
+def write_headers(output_dir, assets):
+    """Netlify _headers marking the fingerprinted files as immutable"""
+    lines = []
+    for hashed, _ in assets.values():
+        lines += [f'/{hashed}', f'  Cache-Control: {IMMUTABLE}']
+    (output_dir / HEADERS_FILENAME).write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+def optimize_assets(output_dir):
+    """Fingerprint assets, rewrite every page's references and inline the critical CSS
+
+    Every template shares the header and hero above the fold, so one
+    critical block, covering what any page shows there, is inlined on all.
+    Returns (pages rewritten, critical CSS bytes).
+    """
+    output_dir = Path(output_dir)
+    assets = fingerprint_assets(output_dir)
+    if not assets:
+        return 0, 0
+    write_headers(output_dir, assets)
+    stylesheet = assets[STYLESHEET][1] if STYLESHEET in assets else ''
+
+    # First pass: what any page shows above the fold
+    html_files = find_html_files(output_dir)
+    tokens = (set(), set(), set())
+    for file_path in html_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            found = markup_tokens(above_the_fold(f.read()))
+        tokens = tuple(known | new for known, new in zip(tokens, found))
+    critical = critical_css(stylesheet, tokens)
+
+    # Second pass: rewrite references
+    rewritten = 0
+    for file_path in html_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        new_content = rewrite_references(content, assets, critical)
+        if new_content != content:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(new_content)
+            rewritten += 1
+    return rewritten, len(critical.encode('utf-8'))
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'built site to optimize in place (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    args = parser.parse_args()
+
+    rewritten, critical = optimize_assets(args.output)
+    print(f"Rewrote asset references in {rewritten} pages; inlined {critical} bytes of critical CSS.")
+
+if __name__ == "__main__":
+    main()
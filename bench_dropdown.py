@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dropdown locator against the old eight-link regex on pathological inputs
+"""
+
+import re
+import time
+
+from fix_navigation import replace_location_dropdowns
+
+# The regex fix_navigation.py used before the forward-pass locator
+LEGACY_DROPDOWN_PATTERN = re.compile(
+    r'<div class="dropdown-content">' + r'\s*<a href="[^"]*">[^<]*</a>' * 8 + r'\s*</div>',
+    re.DOTALL
+)
+
+LINK = '<a href="st-george.html">Belpre</a>\n'
+
+def many_openers(n):
+    """Dropdowns with seven links each that never close the way the regex expects"""
+    return ('<div class="dropdown-content">\n' + LINK * 7 + '<span>\n') * n
+
+def long_menu(n):
+    """One dropdown with n links"""
+    return '<div class="dropdown-content">\n' + LINK * n + '</div>\n'
+
+def unterminated_links(n):
+    """An opener followed by links missing their closing quote and tag"""
+    return '<div class="dropdown-content">\n' + '<a href="st-george.html>Belpre ' * n
+
+def whitespace_runs(n):
+    """Links separated by long whitespace runs that end in a non-link"""
+    return ('<div class="dropdown-content">' + LINK + ' ' * 200 + 'x') * n
+
+INPUTS = [
+    ('many_openers', many_openers),
+    ('long_menu', long_menu),
+    ('unterminated_links', unterminated_links),
+    ('whitespace_runs', whitespace_runs),
+]
+
+SIZES = [1000, 2000, 4000, 8000, 16000]
+
+def best_time(func, content, repeat=3):
+    """Best wall time of func(content) over a few runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    """Main function"""
+    print(f"{'input':<20}{'n':>7}{'KB':>9}{'locator ms':>12}{'ns/byte':>9}{'regex ms':>11}")
+    for name, build in INPUTS:
+        for n in SIZES:
+            content = build(n)
+            locator = best_time(replace_location_dropdowns, content)
+            legacy = best_time(lambda text: LEGACY_DROPDOWN_PATTERN.sub('', text), content)
+            print(f"{name:<20}{n:>7}{len(content) / 1024:>9.0f}{locator * 1000:>12.2f}"
+                  f"{locator * 1e9 / len(content):>9.1f}{legacy * 1000:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmark the rebrand scripts on synthetic page corpora built from the site's own pages
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import final_update
+import fix_navigation
+import update_content
+from file_jobs import add_jobs_argument
+from rebrand import STAGES, rebrand_file
+from rewrite_engine import build_rules
+from site_tree import find_html_files
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_REPORT = 'bench-results.json'
+
+# Page templates the corpus is modeled on
+TEMPLATE_DIRS = ['locations', 'services']
+
+# Scripts timed end to end, in the order they are normally run
+SCRIPTS = ['update_file_content', 'update_navigation_menus', 'clean_up_remaining_references']
+
+def load_templates(base_dir=BASE_DIR):
+    """(rel_path, content) for every location and service page"""
+    templates = []
+    for name in TEMPLATE_DIRS:
+        for file_path in find_html_files(base_dir / name):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                templates.append((Path(file_path).relative_to(base_dir), f.read()))
+    return templates
+
+def source_market_page(content):
+    """A page as it looked before the rebrand, so every rule has work to do"""
+    content = update_content.source_market_copy(content, build_rules(update_content.REWRITE_RULES))
+    for old_zip, new_zip in fix_navigation.ZIP_REPLACEMENTS:
+        content = content.replace(f'({new_zip})', f'({old_zip})')
+    return content
+
+def scale_page(content, scale):
+    """Repeat the page body scale times to grow pages without changing their shape"""
+    start = content.find('</header>')
+    end = content.rfind('<footer')
+    if scale <= 1 or start < 0 or end < start:
+        return content
+    start += len('</header>')
+    return content[:start] + content[start:end] * scale + content[end:]
+
+def page_variants(templates, scale):
+    """Rebranded and source-market text for every template"""
+    variants = []
+    for rel_path, content in templates:
+        content = scale_page(content, scale)
+        variants.append((rel_path, content, source_market_page(content)))
+    return variants
+
+def generate_corpus(root, pages, variants, hit_rate, seed=0):
+    """Write pages copies of the templates under root, one template set per shard
+
+    Location and service pages keep their file names inside each shard, so
+    every name-based rule still applies. A hit_rate fraction of the pages is
+    written as source-market text; the rest are already rebranded.
+
+    Returns (total bytes, pages written as source-market text).
+    """
+    rng = random.Random(seed)
+    total_bytes = hits = 0
+    for index in range(pages):
+        rel_path, rebranded, source = variants[index % len(variants)]
+        is_hit = rng.random() < hit_rate
+        content = source if is_hit else rebranded
+        path = Path(root) / f'{index // len(variants):05d}' / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        total_bytes += len(content.encode('utf-8'))
+        hits += is_hit
+    return total_bytes, hits
+
+def throughput(seconds, pages, total_bytes):
+    """Timing entry with page and byte rates"""
+    return {
+        'seconds': seconds,
+        'pages_per_second': pages / seconds if seconds else None,
+        'mb_per_second': total_bytes / seconds / 1e6 if seconds else None,
+    }
+
+def time_scripts(root, jobs):
+    """Wall time of each script over the corpus, run in order like a real rebrand"""
+    seconds = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for file_path in find_html_files(root):
+            update_content.update_file_content(file_path)
+        seconds['update_file_content'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fix_navigation.update_navigation_menus(jobs, base_dir=root)
+        seconds['update_navigation_menus'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        final_update.clean_up_remaining_references(base_dir=root)
+        seconds['clean_up_remaining_references'] = time.perf_counter() - started
+    return seconds
+
+def time_stages(root):
+    """Per-stage time of the combined pipeline, summed over files"""
+    timings = {}
+    for file_path in find_html_files(root):
+        _, _, file_timings = rebrand_file(file_path)
+        for name, seconds in file_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+    return {name: timings.get(name, 0.0) for name in ['read'] + [name for name, _ in STAGES] + ['write']}
+
+def run_size(pages, variants, args):
+    """Generate one corpus size and time the scripts and the stages on it"""
+    work_dir = Path(tempfile.mkdtemp(prefix='bench-rebrand-', dir=args.work_dir))
+    try:
+        started = time.perf_counter()
+        total_bytes, hits = generate_corpus(work_dir / 'scripts', pages, variants, args.hit_rate, args.seed)
+        generate_corpus(work_dir / 'stages', pages, variants, args.hit_rate, args.seed)
+        generate_seconds = time.perf_counter() - started
+
+        scripts = time_scripts(work_dir / 'scripts', args.jobs)
+        stages = time_stages(work_dir / 'stages')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'pages': pages,
+        'bytes': total_bytes,
+        'hit_pages': hits,
+        'generate_seconds': generate_seconds,
+        'scripts': {name: throughput(scripts[name], pages, total_bytes) for name in SCRIPTS},
+        'total': throughput(sum(scripts.values()), pages, total_bytes),
+        'stages': stages,
+    }
+
+def environment():
+    """Where the numbers came from"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def print_result(result):
+    """Print one corpus size as a table row per script and stage"""
+    print(f"\n{result['pages']} pages, {result['bytes'] / 1e6:.1f} MB, {result['hit_pages']} source-market "
+          f"(generated in {result['generate_seconds']:.1f} s)")
+    for name in SCRIPTS + ['total']:
+        timing = result[name] if name == 'total' else result['scripts'][name]
+        print(f"  {name:<32}{timing['seconds']:9.2f} s{timing['pages_per_second']:10.0f} pages/s"
+              f"{timing['mb_per_second']:8.1f} MB/s")
+    print("  stages: " + ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in result['stages'].items()))
+
+def script_seconds(result, name):
+    """Seconds taken by one script, or by all of them for 'total'"""
+    if name == 'total':
+        return result['total']['seconds']
+    return result['scripts'][name]['seconds']
+
+def print_comparison(results, baseline):
+    """Print total time against a previous report, matched by page count"""
+    previous = {result['pages']: result for result in baseline['results']}
+    print(f"\nCompared with {baseline['environment'].get('commit') or 'baseline'}:")
+    for result in results:
+        old = previous.get(result['pages'])
+        if old is None:
+            continue
+        for name in SCRIPTS + ['total']:
+            new_seconds = script_seconds(result, name)
+            old_seconds = script_seconds(old, name)
+            change = (new_seconds - old_seconds) / old_seconds * 100 if old_seconds else 0.0
+            print(f"  {result['pages']:>7} {name:<32}{old_seconds:9.2f} s -> {new_seconds:9.2f} s ({change:+.1f}%)")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--pages', type=int, nargs='+', default=DEFAULT_SIZES, metavar='N',
+                        help='corpus sizes in pages (default: 1000 10000 100000)')
+    parser.add_argument('--scale', type=int, default=1, metavar='K',
+                        help='repeat each page body K times to make larger pages (default: 1)')
+    parser.add_argument('--hit-rate', type=float, default=0.5, metavar='FRACTION',
+                        help='fraction of pages written as source-market text the rules rewrite (default: 0.5)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for choosing which pages are hits')
+    parser.add_argument('--work-dir', type=Path, default=None,
+                        help='directory for the generated corpora (default: system temp directory)')
+    parser.add_argument('--output', '-o', type=Path, default=Path(DEFAULT_REPORT),
+                        help=f'JSON results file (default: {DEFAULT_REPORT})')
+    parser.add_argument('--compare', type=Path, metavar='REPORT',
+                        help='earlier JSON results file to compare against')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if not 0.0 <= args.hit_rate <= 1.0:
+        parser.error('--hit-rate must be between 0 and 1')
+
+    variants = page_variants(load_templates(), args.scale)
+    results = []
+    for pages in args.pages:
+        print(f"Benchmarking {pages} pages...", flush=True)
+        result = run_size(pages, variants, args)
+        print_result(result)
+        results.append(result)
+
+    report = {
+        'environment': environment(),
+        'parameters': {
+            'templates': len(variants),
+            'scale': args.scale,
+            'hit_rate': args.hit_rate,
+            'seed': args.seed,
+            'jobs': args.jobs,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Persistent manifest for skipping files whose inputs have not changed
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CACHE_FILENAME = '.rebrand-cache.json'
+
+def content_digest(content):
+    """SHA-256 of page content"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def rules_hash(*parts):
+    """Hash of everything that decides a file's output (rule tables, module sources)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()
+
+def module_source(module):
+    """Source text of a module, for including its code in a rules hash"""
+    return Path(module.__file__).read_text(encoding='utf-8')
+
+class BuildCache:
+    """JSON manifest of each file's mtime, size and content hash under one rule set
+
+    A file whose mtime and size match its entry is skipped without being read.
+    Entries recorded under a different rule set are dropped on load.
+    """
+
+    def __init__(self, base_dir, ruleset, filename=CACHE_FILENAME):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / filename
+        self.ruleset = ruleset
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('ruleset') == ruleset:
+                self.entries = data.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, file_path):
+        return Path(file_path).relative_to(self.base_dir).as_posix()
+
+    def is_fresh(self, file_path):
+        """True when the file's mtime and size match its manifest entry"""
+        entry = self.entries.get(self._key(file_path))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        return entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    def digest(self, file_path):
+        """Recorded content hash, used to skip files that were only touched"""
+        entry = self.entries.get(self._key(file_path))
+        return entry['sha256'] if entry else None
+
+    def record(self, file_path, digest):
+        """Record the file's current stat and content hash"""
+        stat = os.stat(file_path)
+        self.entries[self._key(file_path)] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': digest,
+        }
+
+    def forget(self, file_path):
+        """Drop a file's entry so it is processed next run"""
+        self.entries.pop(self._key(file_path), None)
+
+    def prune(self, file_paths):
+        """Drop entries for files that no longer exist in the tree"""
+        keep = {self._key(file_path) for file_path in file_paths}
+        self.entries = {key: entry for key, entry in self.entries.items() if key in keep}
+
+    def save(self):
+        """Write the manifest atomically"""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ruleset': self.ruleset, 'files': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Build the site from shared partials and site data instead of regex-patching every page
+"""
+
+import argparse
+import json
+import re
+import shutil
+import time
+from functools import lru_cache
+from html import escape
+from pathlib import Path
+from string import Template
+
+from asset_pipeline import optimize_assets
+from compress_pipeline import format_totals, precompress_site
+from file_jobs import UNCHANGED, UPDATED, add_jobs_argument
+from image_pipeline import optimize_images
+from search_index import build_search_index
+from site_data import BUSINESS, LOCATIONS, SERVICES, featured_locations
+from site_tree import find_html_files, page_kind
+
+BASE_DIR = Path(__file__).parent
+TEMPLATES_DIR = BASE_DIR / 'templates'
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build'
+
+# Static files copied next to the rendered pages
+ASSETS = ['css', 'js', 'images', 'robots.txt', 'sitemap.xml']
+
+MENU_LINK = Template('                        <a href="$href">$label</a>')
+LIST_LINK = Template('                        <li><a href="$href">$label</a></li>')
+KEYWORDS_META = Template('    <meta name="keywords" content="$keywords">\n')
+BEACON_ATTRIBUTE = Template(' data-beacon="$url"')
+
+TITLE_PATTERN = re.compile(r'<title>([^<]*)</title>')
+META_PATTERN = re.compile(r'<meta name="(description|keywords)" content="([^"]*)"')
+
+@lru_cache(maxsize=None)
+def load_template(name, templates_dir=TEMPLATES_DIR):
+    """Load and compile a partial once per process"""
+    with open(Path(templates_dir) / f'{name}.html', 'r', encoding='utf-8') as f:
+        return Template(f.read())
+
+def extract_body(content):
+    """Page-specific content between the end of the header and the footer"""
+    start = content.find('</header>')
+    end = content.rfind('<footer')
+    if start < 0 or end < start:
+        return None
+    body = content[start + len('</header>'):end].rstrip()
+    if body.endswith('<!-- Footer -->'):
+        body = body[:-len('<!-- Footer -->')].rstrip()
+    return body + '\n\n'
+
+def extract_metadata(content):
+    """Title, description and keywords already on the page"""
+    metadata = {}
+    title = TITLE_PATTERN.search(content)
+    if title:
+        metadata['title'] = title.group(1)
+    for name, value in META_PATTERN.findall(content):
+        metadata.setdefault(name, value)
+    return metadata
+
+def postal_address(business):
+    """Schema.org PostalAddress for the business"""
+    return {
+        '@type': 'PostalAddress',
+        'streetAddress': business['street'],
+        'addressLocality': business['city'],
+        'addressRegion': business['state'],
+        'postalCode': business['zip'],
+    }
+
+def build_schema(kind, info, business):
+    """JSON-LD data for a page"""
+    rating = {
+        '@type': 'AggregateRating',
+        'ratingValue': business.get('rating', '4.9'),
+        'reviewCount': business.get('review_count', '127'),
+    }
+    area = f"{business['city']}, {business['state']}"
+
+    if kind == 'service':
+        return {
+            '@context': 'https://schema.org',
+            '@type': 'Service',
+            'name': info['label'],
+            'description': info['description'],
+            'provider': {
+                '@type': 'LocalBusiness',
+                'name': business['name'],
+                'telephone': business['phone'],
+                'address': postal_address(business),
+            },
+            'areaServed': area,
+            'aggregateRating': rating,
+        }
+
+    if kind == 'location':
+        city = info['city']
+        return {
+            '@context': 'https://schema.org',
+            '@type': 'LocalBusiness',
+            'name': business['name'],
+            'address': postal_address(business),
+            'telephone': business['phone'],
+            'aggregateRating': rating,
+            'serviceArea': city if ', ' in city else f"{city}, {business['state_name']}",
+        }
+
+    geo = {
+        '@type': 'GeoCoordinates',
+        'latitude': business['latitude'],
+        'longitude': business['longitude'],
+    }
+    return {
+        '@context': 'https://schema.org',
+        '@type': 'LocalBusiness',
+        'name': business['name'],
+        'image': 'images/mini-split-1.jpg',
+        '@id': f"https://{business['domain']}",
+        'url': f"https://{business['domain']}",
+        'telephone': business['phone'],
+        'address': dict(postal_address(business), addressCountry='US'),
+        'geo': geo,
+        'openingHoursSpecification': {
+            '@type': 'OpeningHoursSpecification',
+            'dayOfWeek': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+            'opens': '00:00',
+            'closes': '23:59',
+        },
+        'sameAs': [business['facebook'], business['instagram']],
+        'aggregateRating': rating,
+        'priceRange': '$$',
+        'serviceArea': {
+            '@type': 'GeoCircle',
+            'geoMidpoint': geo,
+            'geoRadius': '25000',
+        },
+    }
+
+def format_schema(schema):
+    """Serialize JSON-LD indented to sit inside the head partial"""
+    text = json.dumps(schema, indent=4, ensure_ascii=False)
+    return '\n'.join('    ' + line for line in text.splitlines())
+
+def parse_page(rel_path, content, services=SERVICES, locations=LOCATIONS):
+    """Split a source page into the parts the templates need, or None without header/footer
+
+    A page in services/ or locations/ with no entry in site_data renders
+    as a plain page.
+    """
+    body = extract_body(content)
+    if body is None:
+        return None
+    kind = page_kind(rel_path)
+    if (kind == 'service' and rel_path.name not in services) or (kind == 'location' and rel_path.name not in locations):
+        kind = 'page'
+    return {
+        'rel_path': rel_path,
+        'kind': kind,
+        'body': body,
+        'metadata': extract_metadata(content),
+    }
+
+def page_context(page, business=BUSINESS, services=SERVICES, locations=LOCATIONS):
+    """Template values for one parsed page"""
+    rel_path = page['rel_path']
+    kind = page['kind']
+    root = '../' * (len(rel_path.parts) - 1)
+    metadata = dict(page['metadata'])
+    info = {}
+    if kind == 'service':
+        info = services[rel_path.name]
+    elif kind == 'location':
+        info = locations[rel_path.name]
+    metadata.update({key: info[key] for key in ('title', 'description', 'keywords') if key in info})
+
+    featured = featured_locations(locations)
+    context = dict(business)
+    context.update({
+        'root': root,
+        'body': page['body'],
+        'title': metadata.get('title', business['name']),
+        'description': metadata.get('description', ''),
+        'keywords_meta': KEYWORDS_META.substitute(keywords=metadata['keywords']) if 'keywords' in metadata else '',
+        'beacon_attribute': BEACON_ATTRIBUTE.substitute(url=escape(business['beacon_url'])) if business.get('beacon_url') else '',
+        'schema': format_schema(build_schema(kind, info, business)),
+        'banner_area': f" in {info['city']}" if kind == 'location' else '',
+        'home_href': '#home' if kind == 'index' else f'{root}index.html',
+        'contact_href': '#contact' if kind == 'index' else f'{root}index.html#contact',
+        'services_menu': '\n'.join(
+            MENU_LINK.substitute(href=f'{root}services/{filename}', label=service['label'])
+            for filename, service in services.items()
+        ),
+        'locations_menu': '\n'.join(
+            MENU_LINK.substitute(href=f'{root}locations/{filename}', label=location['city'])
+            for filename, location in featured.items()
+        ),
+        'services_list': '\n'.join(
+            LIST_LINK.substitute(href=f'{root}services/{filename}', label=service['label'])
+            for filename, service in services.items()
+        ),
+        'areas_list': '\n'.join(
+            LIST_LINK.substitute(href=f'{root}locations/{filename}', label=f"{location['city']} ({location['zip']})")
+            for filename, location in featured.items()
+        ),
+    })
+    return context
+
+def render_parsed(page, business=BUSINESS, services=SERVICES, locations=LOCATIONS):
+    """Render a full page from the partials around a parsed page's body"""
+    context = page_context(page, business, services, locations)
+    return ''.join([
+        load_template('head').substitute(context),
+        load_template('header').substitute(context),
+        context['body'],
+        load_template('footer').substitute(context),
+    ])
+
+def render_page(rel_path, content, business=BUSINESS):
+    """Render a full page from the partials around its own body content"""
+    page = parse_page(rel_path, content)
+    if page is None:
+        return None
+    return render_parsed(page, business)
+
+def write_if_changed(path, content):
+    """Write content unless the file already holds exactly that"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+def copy_assets(output_dir, base_dir=BASE_DIR, names=ASSETS):
+    """Copy stylesheets, scripts, images and crawler files (or just names) into the output tree"""
+    for name in names:
+        source = base_dir / name
+        if source.is_dir():
+            shutil.copytree(source, output_dir / name, dirs_exist_ok=True)
+        elif source.exists():
+            shutil.copy2(source, output_dir / name)
+
+def build_site(output_dir, base_dir=BASE_DIR, business=BUSINESS):
+    """Render every page into output_dir and return (rendered, written, skipped)"""
+    output_dir = Path(output_dir)
+    rendered = written = skipped = 0
+    for file_path in find_html_files(base_dir):
+        rel_path = Path(file_path).relative_to(base_dir)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            page = render_page(rel_path, content, business)
+            if page is None:
+                print(f"Skipped (no header/footer): {rel_path}")
+                skipped += 1
+                continue
+            rendered += 1
+            if write_if_changed(output_dir / rel_path, page):
+                written += 1
+                print(f"Built: {rel_path}")
+        except Exception as e:
+            print(f"Error building {rel_path}: {e}")
+            skipped += 1
+    copy_assets(output_dir, base_dir)
+    return rendered, written, skipped
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'output directory (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    parser.add_argument('--optimize-images', action='store_true',
+                        help='generate responsive AVIF/WebP/JPEG variants and srcset markup (needs Pillow)')
+    parser.add_argument('--optimize-assets', action='store_true',
+                        help='minify and fingerprint CSS/JS and inline the critical CSS')
+    parser.add_argument('--search-index', action='store_true',
+                        help='write the prefix-sharded search index that js/main.js loads on demand')
+    parser.add_argument('--precompress', action='store_true',
+                        help='minify HTML and write .br/.gz siblings for every text file (last stage)')
+    parser.add_argument('--beacon', metavar='URL',
+                        help='opt pages in to real-user metrics sent to this collector URL (see rum_collector.py)')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    business = dict(BUSINESS, beacon_url=args.beacon) if args.beacon else BUSINESS
+    started = time.perf_counter()
+    rendered, written, skipped = build_site(args.output, business=business)
+    if args.optimize_images:
+        try:
+            pages, encoded, cached = optimize_images(args.output)
+        except RuntimeError as e:
+            parser.error(str(e))
+        print(f"Optimized images in {pages} pages ({encoded} variants encoded, {cached} cached).")
+    if args.search_index:
+        pages, shards, _, total, largest = build_search_index(args.output, args.jobs)
+        print(f"Indexed {pages} pages for search ({shards} shards, {total / 1024:.1f} KB, "
+              f"largest {largest / 1024:.1f} KB).")
+    if args.optimize_assets:
+        pages, critical = optimize_assets(args.output)
+        print(f"Fingerprinted assets in {pages} pages (critical CSS: {critical} B).")
+    if args.precompress:
+        counts, totals = precompress_site(args.output, args.jobs)
+        print(f"Precompressed {counts[UPDATED]} files ({counts[UNCHANGED]} unchanged): {format_totals(totals)}.")
+    elapsed = time.perf_counter() - started
+
+    print(f"\nCompleted! Rendered {rendered} pages ({written} written, {skipped} skipped) "
+          f"into {args.output} in {elapsed * 1000:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Minify the HTML of a built site and write precompressed .br and .gz siblings for its text files
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # .br siblings are only written when Brotli is installed
+    brotli = None
+
+from file_jobs import ERROR, UNCHANGED, UPDATED, add_jobs_argument, map_files
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build'
+STATE_FILENAME = '.compress-cache.json'
+
+# Files worth compressing; only HTML is minified here (CSS/JS are handled by asset_pipeline)
+COMPRESSIBLE = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.xml'}
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Elements whose content is kept byte for byte. Whitespace around the
+# non-rendering ones (script, style) is dropped; around pre/textarea it is kept.
+RAW_BLOCK = re.compile(r'<(pre|textarea|script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+WHITESPACE = re.compile(r'\s+')
+
+# Whitespace next to these tags never renders
+BLOCK_TAGS = [
+    'html', 'head', 'body', 'meta', 'link', 'title', 'base', 'noscript',
+    'header', 'footer', 'main', 'nav', 'section', 'article', 'aside', 'div',
+    'h[1-6]', 'p', 'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'blockquote', 'figure', 'figcaption',
+    'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'form', 'fieldset', 'hr', 'br',
+]
+BLOCK_BOUNDARY = re.compile(
+    r'\s*(<!DOCTYPE[^>]*>|</?(?:' + '|'.join(BLOCK_TAGS) + r')\b[^>]*>|\x01\d+\x01)\s*', re.IGNORECASE
+)
+RESTORE = re.compile(r'([\x01\x02])(\d+)\1')
+
+def minify_html(content):
+    """Collapse insignificant whitespace and drop comments, leaving pre, textarea, scripts and styles intact"""
+    protected = []
+
+    def protect(match):
+        protected.append(match.group(0))
+        marker = '\x01' if match.group(1).lower() in ('script', 'style') else '\x02'
+        return f'{marker}{len(protected) - 1}{marker}'
+
+    content = HTML_COMMENT.sub('', RAW_BLOCK.sub(protect, content))
+    content = WHITESPACE.sub(' ', content)
+    content = BLOCK_BOUNDARY.sub(r'\1', content).strip()
+    return RESTORE.sub(lambda match: protected[int(match.group(2))], content)
+
+def sibling_suffixes():
+    """Precompressed siblings this environment can write"""
+    return ['.br', '.gz'] if brotli is not None else ['.gz']
+
+def compress(data):
+    """{suffix: compressed bytes} for every sibling format"""
+    compressed = {'.gz': gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        compressed['.br'] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return compressed
+
+def write_atomic(path, data):
+    """Write bytes through a temporary file so a server never sees a partial body"""
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def process_file(file_path):
+    """Minify (HTML only) and precompress one file
+
+    Returns (file_path, status, entry, sizes) where sizes is
+    {'raw', 'minified', '.gz', '.br'} in bytes.
+    """
+    path = Path(file_path)
+    try:
+        raw = path.read_bytes()
+        data = raw
+        if path.suffix == '.html':
+            data = minify_html(raw.decode('utf-8')).encode('utf-8')
+            if data != raw:
+                write_atomic(path, data)
+        sizes = {'raw': len(raw), 'minified': len(data)}
+        for suffix, body in compress(data).items():
+            write_atomic(path.with_name(path.name + suffix), body)
+            sizes[suffix] = len(body)
+        stat = path.stat()
+        entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                 'sha256': hashlib.sha256(data).hexdigest()}
+        return file_path, UPDATED, entry, sizes
+    except (OSError, UnicodeDecodeError):
+        return file_path, ERROR, None, None
+
+def find_compressible_files(root):
+    """Text files under root that get precompressed siblings, sorted"""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if not name.startswith('.') and os.path.splitext(name)[1] in COMPRESSIBLE:
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+class CompressState:
+    """JSON record of each output file's stat and content hash after minification
+
+    A file whose mtime and size match is skipped unread; one whose minified
+    content hashes the same is skipped after hashing. Either way its
+    siblings must exist.
+    """
+
+    def __init__(self, root, filename=STATE_FILENAME):
+        self.path = Path(root) / filename
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            if self.entries.get('suffixes') != sibling_suffixes():
+                self.entries = {}
+        except (OSError, ValueError):
+            self.entries = {}
+        self.entries['suffixes'] = sibling_suffixes()
+        self.files = self.entries.setdefault('files', {})
+
+    def is_current(self, file_path, key):
+        """Whether a file and its siblings are already up to date"""
+        if not all(os.path.exists(file_path + suffix) for suffix in sibling_suffixes()):
+            return False
+        entry = self.files.get(key)
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return True
+        # A rebuilt page is minified again here, which is cheap; only compression is skipped
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        data = minify_html(raw.decode('utf-8')).encode('utf-8') if file_path.endswith('.html') else raw
+        if entry['sha256'] != hashlib.sha256(data).hexdigest():
+            return False
+        if data != raw:
+            write_atomic(Path(file_path), data)
+            stat = os.stat(file_path)
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        return True
+
+    def prune(self, keys):
+        """Drop entries, and the siblings, of files that no longer exist"""
+        for key in set(self.files) - keys:
+            for suffix in ('.br', '.gz'):
+                (self.path.parent / (key + suffix)).unlink(missing_ok=True)
+        self.files = self.entries['files'] = {key: entry for key, entry in self.files.items() if key in keys}
+
+    def save(self):
+        """Write the state atomically"""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+def precompress_site(root=DEFAULT_OUTPUT_DIR, jobs=1):
+    """Minify and precompress every changed text file under root
+
+    Returns (counts by status, total sizes of the files processed).
+    """
+    root = Path(root)
+    state = CompressState(root)
+    files = find_compressible_files(root)
+    keys = {}
+    stale = []
+    for file_path in files:
+        key = Path(file_path).relative_to(root).as_posix()
+        keys[file_path] = key
+        if not state.is_current(file_path, key):
+            stale.append(file_path)
+    state.prune(set(keys.values()))
+
+    counts = {UPDATED: 0, UNCHANGED: len(files) - len(stale), ERROR: 0}
+    totals = {}
+    for file_path, status, entry, sizes in map_files(process_file, stale, jobs):
+        counts[status] += 1
+        if status == UPDATED:
+            state.files[keys[file_path]] = entry
+            for name, size in sizes.items():
+                totals[name] = totals.get(name, 0) + size
+        else:
+            print(f"Could not compress: {file_path}")
+    state.save()
+    return counts, totals
+
+def format_totals(totals):
+    """One-line size summary: raw -> minified -> each sibling"""
+    if not totals:
+        return 'no files needed work'
+    parts = [f"{totals['raw'] / 1024:.1f} KB raw", f"{totals['minified'] / 1024:.1f} KB minified"]
+    parts += [f"{totals[suffix] / 1024:.1f} KB {suffix}" for suffix in sibling_suffixes() if suffix in totals]
+    return ' -> '.join(parts)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'built site to process in place (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    parser.add_argument('--rebuild', action='store_true', help=f'ignore {STATE_FILENAME} and redo every file')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+    if brotli is None:
+        print("Brotli is not installed (pip install brotli); writing .gz siblings only.")
+    if args.rebuild:
+        (args.output / STATE_FILENAME).unlink(missing_ok=True)
+
+    started = time.perf_counter()
+    counts, totals = precompress_site(args.output, args.jobs)
+    elapsed = time.perf_counter() - started
+    print(f"Processed {counts[UPDATED]} files, skipped {counts[UNCHANGED]} unchanged, "
+          f"{counts[ERROR]} errors in {elapsed * 1000:.1f} ms.")
+    print(f"  {format_totals(totals)}")
+
+if __name__ == "__main__":
+    main()
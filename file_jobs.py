@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Process-pool helpers for running per-file work across CPU cores
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-file result statuses returned by workers
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+ERROR = 'error'
+
+def add_jobs_argument(parser):
+    """Add the shared --jobs option to an argument parser"""
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='number of worker processes (default: 1)')
+
+def chunk_size(file_count, jobs):
+    """Files per dispatched chunk, about four chunks per worker"""
+    return max(1, file_count // (jobs * 4))
+
+def map_files(worker, files, jobs=1):
+    """Run worker over files and yield results in input order
+
+    With jobs > 1 the files are dispatched to a process pool in chunks; the
+    results still come back in the order of files, so output is the same
+    whatever the worker count.
+    """
+    if jobs <= 1 or len(files) <= 1:
+        for file_path in files:
+            yield worker(file_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(worker, files, chunksize=chunk_size(len(files), jobs))
@@ -3,144 +3,204 @@
 Script to fix remaining location references in HTML files
 """
 
+import argparse
 import os
 import re
 from pathlib import Path
 
+from file_jobs import ERROR, UNCHANGED, UPDATED, add_jobs_argument, map_files
+from rewrite_engine import LITERAL, REGEX, build_rules
+from rule_profile import RuleProfiler, add_profile_arguments, apply_rules, finish_profile
+from site_data import LOCATIONS, featured_locations
+from site_tree import find_html_files
+
 # Base directory
 BASE_DIR = Path(__file__).parent
 
 # Location mappings for navigation menus and links
-LOCATION_MAPPINGS = {
-    'st-george.html': ('Belpre', '45714'),
-    'stapleton.html': ('Marietta', '45750'),
-    'port-richmond.html': ('Little Hocking', '45742'),
-    'tottenville.html': ('Vincent', '45784'),
-    'great-kills.html': ('Barlow', '45712'),
-    'new-dorp.html': ('Parkersburg, WV', '26101'),
-    'west-brighton.html': ('Beverly', '45715'),
-    'castleton-corners.html': ('Williamstown, WV', '26187'),
-    'new-brighton.html': ('Parkersburg, WV', '26101'),
-    'south-beach.html': ('Williamstown, WV', '26187'),
-    'willowbrook.html': ('Athens', '45701'),
-    'clifton.html': ('Vincent', '45784'),
-    'charleston.html': ('Charleston, WV', '25301'),
-    'dongan-hills.html': ('Beverly', '45715'),
-    'eltingville.html': ('Little Hocking', '45742'),
-    'grant-city.html': ('Barlow', '45712'),
-    'mariners-harbor.html': ('Marietta', '45750'),
-    'oakwood.html': ('Athens', '45701'),
-    'pleasant-plains.html': ('Beverly', '45715'),
-    'richmond-valley.html': ('Vincent', '45784'),
-    'bay-terrace.html': ('Parkersburg, WV', '26101')
-}
-
-def update_navigation_menus():
-    """Update navigation menus in all HTML files"""
-    html_files = []
+LOCATION_MAPPINGS = {filename: (info['city'], info['zip']) for filename, info in LOCATIONS.items()}
+
+# Entries written into every location dropdown menu, in menu order
+LOCATION_MENU = [(filename, info['city']) for filename, info in featured_locations().items()]
+
+DROPDOWN_OPEN = '<div class="dropdown-content">'
+
+# Only div and a tags matter inside a dropdown. Tags are bounded by the next
+# '<', so a stray '<' costs one short scan, not a scan to the end of the page
+TAG_PATTERN = re.compile(r'<(/?)(div|a)\b([^<>]*)>', re.IGNORECASE)
+HREF_PATTERN = re.compile(r'\bhref="([^"]*)"')
+
+# Old Staten Island location links, removed from every menu and list
+REMOVED_LOCATION_PAGES = [
+    'bayonne-nj', 'jersey-city-nj', 'hoboken-nj', 'brooklyn-ny', 'manhattan-ny', 'newark-nj',
+    'elizabeth-nj', 'perth-amboy-nj', 'union-city-nj', 'weehawken-nj', 'rosebank',
+]
+
+# Old zip codes and their replacements
+ZIP_REPLACEMENTS = [
+    ('10305', '45714'),
+    ('10306', '45750'),
+    ('10307', '45784'),
+    ('10308', '45712'),
+    ('10309', '45715'),
+    ('10310', '26101'),
+    ('10311', '45742'),
+    ('10312', '26187'),
+    ('10313', '45701'),
+    ('10314', '25301')
+]
+
+# Location reference rewrites applied after the dropdowns, in order
+NAV_RULES = build_rules(
+    # Remove old Staten Island location references
+    [(REGEX, rf'<a href="[^"]*{page}\.html">[^<]*</a>\s*', '') for page in REMOVED_LOCATION_PAGES] +
+    
+    # Update specific content sections
+    [
+        (LITERAL, 'Mid-Island:', 'Central Ohio:'),
+        (LITERAL, 'North Shore:', 'Washington County:'),
+        (LITERAL, 'South Shore:', 'Southern Ohio:'),
+        (LITERAL, 'East Shore:', 'West Virginia Border:'),
+    ] +
+    
+    # Update zip code references
+    [(LITERAL, f'({old_zip})', f'({new_zip})') for old_zip, new_zip in ZIP_REPLACEMENTS]
+)
+
+def hero_rules(city_name):
+    """Hero title and description rules for a location page"""
+    return build_rules([
+        # Update hero title
+        (REGEX, r'<h1>Professional <span class="hero-highlight">HVAC Services</span> in [^<]*</h1>',
+         f'<h1>Professional <span class="hero-highlight">HVAC Services</span> in {city_name}, Ohio</h1>'),
+        
+        # Update hero description
+        (REGEX, r'<p>Expert ductless mini split installation, HVAC repair, and air conditioning services for [^.]*\. Local technicians with 24/7 emergency service\.</p>',
+         f'<p>Expert ductless mini split installation, HVAC repair, and air conditioning services for {city_name} residents. Local technicians with 24/7 emergency service.</p>'),
+    ])
+
+def find_dropdown_blocks(content):
+    """Yield (start, end, hrefs) for each dropdown-content block in one forward pass"""
+    pos = 0
+    while True:
+        start = content.find(DROPDOWN_OPEN, pos)
+        if start < 0:
+            return
+        depth = 1
+        hrefs = []
+        for tag in TAG_PATTERN.finditer(content, start + len(DROPDOWN_OPEN)):
+            closing, name, attrs = tag.groups()
+            name = name.lower()
+            if name == 'div':
+                depth += -1 if closing else 1
+                if depth == 0:
+                    yield start, tag.end(), hrefs
+                    pos = tag.end()
+                    break
+            elif name == 'a' and not closing:
+                href = HREF_PATTERN.search(attrs)
+                hrefs.append(href.group(1) if href else '')
+        else:
+            # Unterminated block; nothing after it can be a complete dropdown
+            return
+
+def render_location_dropdown(prefix, indent):
+    """Location dropdown markup with links relative to the page's location links"""
+    lines = [DROPDOWN_OPEN]
+    for filename, city_name in LOCATION_MENU:
+        lines.append(f'{indent}    <a href="{prefix}{filename}">{city_name}</a>')
+    lines.append(f'{indent}</div>')
+    return '\n'.join(lines)
+
+def replace_location_dropdowns(content):
+    """Swap every location dropdown, whatever its number of links, for LOCATION_MENU
+
+    A dropdown counts as a location dropdown when all of its links point at
+    pages in LOCATION_MAPPINGS. The existing href prefix ('', 'locations/' or
+    '../locations/') and indentation are kept.
+    """
+    parts = []
+    pos = 0
+    for start, end, hrefs in find_dropdown_blocks(content):
+        if not hrefs or not all(os.path.basename(href) in LOCATION_MAPPINGS for href in hrefs):
+            continue
+        prefix = hrefs[0][:len(hrefs[0]) - len(os.path.basename(hrefs[0]))]
+        line_start = content.rfind('\n', 0, start) + 1
+        indent = content[line_start:start]
+        if indent.strip():
+            indent = ''
+        parts.append(content[pos:start])
+        parts.append(render_location_dropdown(prefix, indent))
+        pos = end
+    if not parts:
+        return content
+    parts.append(content[pos:])
+    return ''.join(parts)
+
+def update_navigation_content(content, file_path, profiler=None):
+    """Update navigation menus and location references in page content"""
+    # Update location dropdown menus
+    if profiler is None:
+        content = replace_location_dropdowns(content)
+    else:
+        content = profiler.call('fix_navigation', 'replace_location_dropdowns',
+                                replace_location_dropdowns, content, file_path)
     
-    # Find all HTML files
-    for root, dirs, files in os.walk(BASE_DIR):
-        for file in files:
-            if file.endswith('.html'):
-                html_files.append(os.path.join(root, file))
+    content = apply_rules(NAV_RULES, content, profiler, 'fix_navigation', file_path)
+    
+    # Update hero content for location-specific pages
+    if 'locations/' in str(file_path):
+        filename = os.path.basename(file_path)
+        if filename in LOCATION_MAPPINGS:
+            city_name, zip_code = LOCATION_MAPPINGS[filename]
+            content = apply_rules(hero_rules(city_name), content, profiler, 'fix_navigation.hero', file_path)
+    
+    return content
+
+def update_navigation_file(file_path, profiler=None):
+    """Update navigation in a single HTML file and return (status, message)"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        original_content = content
+        content = update_navigation_content(content, file_path, profiler)
+        
+        # Only write if content changed
+        if content != original_content:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            return UPDATED, f"Updated navigation in: {file_path}"
+        return UNCHANGED, None
+        
+    except Exception as e:
+        return ERROR, f"Error updating {file_path}: {e}"
+
+def update_navigation_menus(jobs=1, profiler=None, base_dir=BASE_DIR):
+    """Update navigation menus in all HTML files; profiling runs serially"""
+    html_files = find_html_files(base_dir)
     
     print(f"Updating navigation menus in {len(html_files)} files...")
     
-    for file_path in html_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            original_content = content
-            
-            # Update location dropdown menus
-            locations_dropdown = '''                    <div class="dropdown-content">
-                        <a href="st-george.html">Belpre</a>
-                        <a href="stapleton.html">Marietta</a>
-                        <a href="port-richmond.html">Little Hocking</a>
-                        <a href="tottenville.html">Vincent</a>
-                        <a href="great-kills.html">Barlow</a>
-                        <a href="new-dorp.html">Parkersburg, WV</a>
-                        <a href="west-brighton.html">Beverly</a>
-                        <a href="castleton-corners.html">Williamstown, WV</a>
-                    </div>'''
-            
-            # Replace location dropdown content
-            content = re.sub(
-                r'<div class="dropdown-content">\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*<a href="[^"]*">[^<]*</a>\s*</div>',
-                locations_dropdown,
-                content,
-                flags=re.DOTALL
-            )
-            
-            # Remove old Staten Island location references
-            content = re.sub(r'<a href="[^"]*bayonne-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*jersey-city-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*hoboken-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*brooklyn-ny\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*manhattan-ny\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*newark-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*elizabeth-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*perth-amboy-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*union-city-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*weehawken-nj\.html">[^<]*</a>\s*', '', content)
-            content = re.sub(r'<a href="[^"]*rosebank\.html">[^<]*</a>\s*', '', content)
-            
-            # Update specific content sections
-            content = content.replace('Mid-Island:', 'Central Ohio:')
-            content = content.replace('North Shore:', 'Washington County:')
-            content = content.replace('South Shore:', 'Southern Ohio:')
-            content = content.replace('East Shore:', 'West Virginia Border:')
-            
-            # Update zip code references
-            for old_zip, new_info in [
-                ('10305', '45714'),
-                ('10306', '45750'),
-                ('10307', '45784'),
-                ('10308', '45712'),
-                ('10309', '45715'),
-                ('10310', '26101'),
-                ('10311', '45742'),
-                ('10312', '26187'),
-                ('10313', '45701'),
-                ('10314', '25301')
-            ]:
-                content = content.replace(f'({old_zip})', f'({new_info})')
-            
-            # Update hero content for location-specific pages
-            if 'locations/' in file_path:
-                filename = os.path.basename(file_path)
-                if filename in LOCATION_MAPPINGS:
-                    city_name, zip_code = LOCATION_MAPPINGS[filename]
-                    
-                    # Update hero title
-                    content = re.sub(
-                        r'<h1>Professional <span class="hero-highlight">HVAC Services</span> in [^<]*</h1>',
-                        f'<h1>Professional <span class="hero-highlight">HVAC Services</span> in {city_name}, Ohio</h1>',
-                        content
-                    )
-                    
-                    # Update hero description
-                    content = re.sub(
-                        r'<p>Expert ductless mini split installation, HVAC repair, and air conditioning services for [^.]*\. Local technicians with 24/7 emergency service\.</p>',
-                        f'<p>Expert ductless mini split installation, HVAC repair, and air conditioning services for {city_name} residents. Local technicians with 24/7 emergency service.</p>',
-                        content
-                    )
-            
-            # Only write if content changed
-            if content != original_content:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f"Updated navigation in: {file_path}")
-            
-        except Exception as e:
-            print(f"Error updating {file_path}: {e}")
+    if profiler is not None:
+        results = (update_navigation_file(file_path, profiler) for file_path in html_files)
+    else:
+        results = map_files(update_navigation_file, html_files, jobs)
+    for status, message in results:
+        if message:
+            print(message)
 
 def main():
     """Main function"""
-    update_navigation_menus()
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = RuleProfiler() if args.profile else None
+    
+    update_navigation_menus(args.jobs, profiler)
     print("Navigation menu updates completed!")
+    finish_profile(profiler, args)
 
 if __name__ == "__main__":
     main()
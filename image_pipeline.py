@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Generate responsive image variants for a built site and point its <img> tags at them
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is only needed for this stage
+    Image = None
+
+from asset_pipeline import above_the_fold
+from site_tree import find_html_files
+
+BASE_DIR = Path(__file__).parent
+CACHE_DIR = BASE_DIR / '.image-cache'
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build'
+
+# Variant widths; each source also gets one variant at its own width
+WIDTHS = [320, 480, 640, 960]
+
+# Formats in the order browsers should try them: (extension, Pillow format, MIME type, save options)
+FORMATS = [
+    ('avif', 'AVIF', 'image/avif', {'quality': 50}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 75, 'method': 6}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+
+SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Content images fill their column up to their own width
+SIZES = '(max-width: {width}px) 100vw, {width}px'
+
+# Loading hints by position on the page
+LOADING = {
+    'lazy': 'loading="lazy" decoding="async"',
+    'eager': 'decoding="async"',
+    'high': 'fetchpriority="high"',
+}
+
+IMG_TAG = re.compile(r'<img\b([^<>]*)>', re.IGNORECASE)
+SRC_ATTR = re.compile(r'\bsrc="([^"]*)"')
+
+def available_formats():
+    """FORMATS this Pillow build can encode"""
+    return [fmt for fmt in FORMATS if fmt[0] != 'avif' or features.check('avif')]
+
+def source_digest(path):
+    """SHA-256 of an image file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def variant_widths(width):
+    """Widths to encode for a source of this width, never upscaling"""
+    return [w for w in WIDTHS if w < width] + [width]
+
+def format_settings(fmt):
+    """Short hash of a format's encoder settings; it keys that format's cached variants"""
+    extension, pillow_format, _, options = fmt
+    settings = [extension, pillow_format, sorted(options.items()), 'LANCZOS']
+    return hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()[:8]
+
+def encode_variant(image, width, fmt, target):
+    """Resize image to width and save it in fmt at target"""
+    _, pillow_format, _, options = fmt
+    height = round(image.height * width / image.width)
+    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+    if pillow_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+        resized = resized.convert('RGB')
+    temp_path = target.with_name(target.name + '.tmp')
+    resized.save(temp_path, pillow_format, **options)
+    os.replace(temp_path, target)
+
+def copy_if_changed(source, target):
+    """Copy source over target unless they already have the same size and bytes"""
+    if target.exists() and target.stat().st_size == source.stat().st_size:
+        if target.read_bytes() == source.read_bytes():
+            return False
+    shutil.copyfile(source, target)
+    return True
+
+class ImageVariants:
+    """Encoder for source images whose variants are cached by content hash
+
+    build() returns the same (width, height, {extension: [(width, name)]})
+    whether the variants were encoded now or copied from the cache.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, formats=None):
+        self.cache_dir = Path(cache_dir)
+        self.formats = formats if formats is not None else available_formats()
+        self.encoded = 0
+        self.cached = 0
+
+    def build(self, source):
+        """Write every variant of source next to it and return its variant table
+
+        The source is only decoded when a variant is missing from the cache;
+        its dimensions are cached alongside the variants.
+        """
+        source = Path(source)
+        digest = source_digest(source)[:20]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        size_path = self.cache_dir / f'{digest}.json'
+        try:
+            width, height = json.loads(size_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            with Image.open(source) as image:
+                width, height = image.size
+            size_path.write_text(json.dumps([width, height]), encoding='utf-8')
+
+        image = None
+        table = {}
+        try:
+            for fmt in self.formats:
+                extension = fmt[0]
+                settings = format_settings(fmt)
+                table[extension] = []
+                for variant_width in variant_widths(width):
+                    cached = self.cache_dir / f'{digest}-{settings}-{variant_width}.{extension}'
+                    if cached.exists():
+                        self.cached += 1
+                    else:
+                        if image is None:
+                            image = Image.open(source)
+                            image.load()
+                        encode_variant(image, variant_width, fmt, cached)
+                        self.encoded += 1
+                    name = f'{source.stem}-{variant_width}.{extension}'
+                    copy_if_changed(cached, source.with_name(name))
+                    table[extension].append((variant_width, name))
+        finally:
+            if image is not None:
+                image.close()
+        return width, height, table
+
+def srcset(prefix, variants):
+    """srcset attribute value for [(width, name)]"""
+    return ', '.join(f'{prefix}{name} {width}w' for width, name in variants)
+
+def render_picture(attrs, src, info, formats, loading='lazy'):
+    """<picture> with one <source> per modern format around a sized <img>
+
+    loading is a LOADING key: 'high' for the page's likely LCP image,
+    'eager' for others above the fold, 'lazy' for the rest.
+    """
+    width, height, table = info
+    prefix = src[:src.rfind('/') + 1]
+    sizes = SIZES.format(width=width)
+    mime_types = {fmt[0]: fmt[2] for fmt in formats}
+    fallback = 'jpg' if 'jpg' in table else next(iter(table))
+
+    sources = ''.join(
+        f'<source type="{mime_types[extension]}" srcset="{srcset(prefix, variants)}" sizes="{sizes}">'
+        for extension, variants in table.items() if extension != fallback
+    )
+    largest = table[fallback][-1][1]
+    attrs = SRC_ATTR.sub(f'src="{prefix}{largest}"', attrs, count=1).rstrip()
+    img = (f'<img{attrs} srcset="{srcset(prefix, table[fallback])}" sizes="{sizes}" '
+           f'width="{width}" height="{height}" {LOADING[loading]}>')
+    return f'<picture>{sources}{img}</picture>'
+
+def rewrite_images(content, page_dir, lookup, formats=FORMATS):
+    """Replace plain <img> tags whose source has variants; lookup(path) returns variant info or None
+
+    formats must be the ones the variants were encoded in, e.g. ImageVariants.formats.
+
+    The first content image, the likely LCP element, loads eagerly with
+    high priority; other images above the fold load eagerly and the rest
+    lazily.
+    """
+    fold = len(above_the_fold(content))
+    first = [True]
+
+    def replace(match):
+        attrs = match.group(1)
+        src = SRC_ATTR.search(attrs)
+        if src is None or 'srcset=' in attrs or '://' in src.group(1):
+            return match.group(0)
+        if content.rfind('<picture', 0, match.start()) > content.rfind('</picture>', 0, match.start()):
+            return match.group(0)
+        info = lookup(os.path.normpath(page_dir / src.group(1)))
+        if info is None:
+            return match.group(0)
+        if first[0]:
+            loading = 'high'
+            first[0] = False
+        else:
+            loading = 'eager' if match.start() < fold else 'lazy'
+        return render_picture(attrs, src.group(1), info, formats, loading)
+
+    return IMG_TAG.sub(replace, content)
+
+def optimize_images(output_dir, cache_dir=CACHE_DIR):
+    """Encode variants for every local raster image the built pages use and rewrite their tags
+
+    Returns (pages rewritten, variants encoded, variants taken from the cache).
+    """
+    if Image is None:
+        raise RuntimeError('Pillow is required for image optimization: pip install Pillow')
+
+    output_dir = Path(output_dir)
+    variants = ImageVariants(cache_dir)
+    tables = {}
+
+    def lookup(path):
+        if path not in tables:
+            source = Path(path)
+            usable = (source.suffix.lower() in SOURCE_EXTENSIONS and source.is_file()
+                      and output_dir.resolve() in source.resolve().parents)
+            tables[path] = variants.build(source) if usable else None
+        return tables[path]
+
+    rewritten = 0
+    for file_path in find_html_files(output_dir):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        new_content = rewrite_images(content, Path(file_path).parent, lookup, variants.formats)
+        if new_content != content:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(new_content)
+            rewritten += 1
+    return rewritten, variants.encoded, variants.cached
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'built site to optimize in place (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    parser.add_argument('--cache', type=Path, default=CACHE_DIR,
+                        help=f'directory of encoded variants keyed by source hash (default: {CACHE_DIR.name}/)')
+    args = parser.parse_args()
+    if Image is None:
+        parser.error('Pillow is required for image optimization: pip install Pillow')
+
+    rewritten, encoded, cached = optimize_images(args.output, args.cache)
+    print(f"Rewrote images in {rewritten} pages; encoded {encoded} variants, reused {cached} from cache.")
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let lastScrollTop = 0;
     
     window.addEventListener('scroll', function() {
+        const started = performance.now();
         let scrollTop = window.pageYOffset || document.documentElement.scrollTop;
         
         if (scrollTop > lastScrollTop && scrollTop > 100) {
@@ -48,6 +49,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         lastScrollTop = scrollTop;
+        timeScrollHandler(started);
     });
     
     // Add animation to elements when they come into view
@@ -134,3 +136,252 @@ document.addEventListener('DOMContentLoaded', function() {
     
     images.forEach(img => imageObserver.observe(img));
 });
+
+// Site search: the index is split into small shards by the first two
+// letters of each term, or three digits of a number (see search_index.py),
+// fetched only once a query needs them. The search box is only added to
+// pages whose script tag carries data-search, which search_index.py sets
+// once the index is written
+const searchEnabled = document.currentScript ? 'search' in document.currentScript.dataset : false;
+const searchRoot = document.currentScript
+    ? document.currentScript.src.replace(/js\/main(\.[0-9a-f]+)?\.js(\?.*)?$/, '')
+    : '/';
+const searchShards = {};
+
+function searchTerms(query) {
+    return query.normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase()
+        .split(/[^a-z0-9]+/)
+        .filter(term => term.length >= 2);
+}
+
+function searchShardKey(term) {
+    return /^[0-9]/.test(term) ? term.slice(0, 3) : term.slice(0, 2);
+}
+
+function loadSearchShard(key) {
+    if (!searchShards[key]) {
+        const empty = { terms: {}, common: [], stopwords: [], docs: {} };
+        searchShards[key] = fetch(searchRoot + 'search/' + key + '.json')
+            .then(response => response.ok ? response.json() : empty)
+            .catch(() => empty);
+    }
+    return searchShards[key];
+}
+
+// An indexed term matches a query word it starts with (typing "bel" finds
+// "belpre") or that starts with it, allowing a short ending ("pumps" finds "pump")
+function searchTermMatches(indexed, word) {
+    return indexed.startsWith(word) ||
+        (word.startsWith(indexed) && indexed.length >= Math.max(3, word.length - 2));
+}
+
+function searchSite(query) {
+    const terms = searchTerms(query);
+    if (!terms.length) {
+        return Promise.resolve([]);
+    }
+    return Promise.all(terms.map(term => loadSearchShard(searchShardKey(term)))).then(shards => {
+        let scores = null;
+        const docs = {};
+        terms.forEach((term, i) => {
+            const shard = shards[i];
+            // Stopwords and words on most pages (like "services") are not indexed and do not narrow the results
+            if (shard.stopwords.includes(term) || shard.common.includes(term)) {
+                return;
+            }
+            const termScores = {};
+            let matched = false;
+            Object.keys(shard.terms).forEach(indexed => {
+                if (searchTermMatches(indexed, term)) {
+                    matched = true;
+                    shard.terms[indexed].forEach(([id, weight]) => {
+                        termScores[id] = Math.max(termScores[id] || 0, weight);
+                    });
+                }
+            });
+            // A word nothing was indexed for (a typo, or a missing shard) is ignored rather than emptying the results
+            if (!matched) {
+                return;
+            }
+            Object.assign(docs, shard.docs);
+            if (scores === null) {
+                scores = termScores;
+            } else {
+                Object.keys(scores).forEach(id => {
+                    if (id in termScores) {
+                        scores[id] += termScores[id];
+                    } else {
+                        delete scores[id];
+                    }
+                });
+            }
+        });
+        return Object.keys(scores || {})
+            .sort((a, b) => scores[b] - scores[a] || docs[a][1].localeCompare(docs[b][1]))
+            .slice(0, 8)
+            .map(id => ({ url: searchRoot + docs[id][0], title: docs[id][1] }));
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const navMenu = document.querySelector('.nav-menu');
+    if (!navMenu || !window.fetch || !searchEnabled) {
+        return;
+    }
+
+    const item = document.createElement('li');
+    item.className = 'nav-item nav-search';
+    item.style.position = 'relative';
+    const input = document.createElement('input');
+    input.type = 'search';
+    input.placeholder = 'Search services & towns';
+    input.setAttribute('aria-label', 'Search this site');
+    input.style.cssText = 'padding: 0.4rem 0.6rem; border: 1px solid #ccc; border-radius: 4px; font: inherit; width: 12rem;';
+    const results = document.createElement('div');
+    results.className = 'dropdown-content';
+    item.appendChild(input);
+    item.appendChild(results);
+    navMenu.appendChild(item);
+
+    // Only the latest query may fill the list, whichever shard arrives first
+    let ticket = 0;
+    input.addEventListener('input', function() {
+        const current = ++ticket;
+        searchSite(input.value).then(matches => {
+            if (current !== ticket) {
+                return;
+            }
+            results.innerHTML = '';
+            matches.forEach(match => {
+                const link = document.createElement('a');
+                link.href = match.url;
+                link.textContent = match.title;
+                results.appendChild(link);
+            });
+            results.style.display = matches.length ? 'block' : 'none';
+        });
+    });
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            results.style.display = 'none';
+        }
+    });
+    document.addEventListener('click', function(e) {
+        if (!item.contains(e.target)) {
+            results.style.display = 'none';
+        }
+    });
+});
+
+// Real-user metrics, opt-in: pages built with a data-beacon="<collector URL>"
+// attribute on this script (build_site.py --beacon, see rum_collector.py)
+// queue Web Vitals and long tasks and send them in batches with sendBeacon
+const beaconUrl = document.currentScript ? document.currentScript.dataset.beacon : '';
+const beaconQueue = [];
+let scrollHandlerMax = 0;
+
+function recordMetric(name, value) {
+    if (!beaconUrl) {
+        return;
+    }
+    beaconQueue.push([name, Math.round(value * 1000) / 1000]);
+    if (beaconQueue.length >= 25) {
+        flushBeacon();
+    }
+}
+
+function flushBeacon() {
+    if (scrollHandlerMax) {
+        beaconQueue.push(['scroll_handler', Math.round(scrollHandlerMax * 1000) / 1000]);
+        scrollHandlerMax = 0;
+    }
+    if (!beaconUrl || !beaconQueue.length) {
+        return;
+    }
+    const payload = JSON.stringify({ page: location.pathname, metrics: beaconQueue.splice(0) });
+    if (!(navigator.sendBeacon && navigator.sendBeacon(beaconUrl, payload))) {
+        fetch(beaconUrl, { method: 'POST', body: payload, keepalive: true }).catch(() => {});
+    }
+}
+
+// Called at the end of the header scroll handler: the slowest run goes out
+// with the next batch, and any run of 50 ms or more counts as a long task
+function timeScrollHandler(started) {
+    if (!beaconUrl) {
+        return;
+    }
+    const elapsed = performance.now() - started;
+    scrollHandlerMax = Math.max(scrollHandlerMax, elapsed);
+    if (elapsed >= 50) {
+        recordMetric('scroll_long_task', elapsed);
+    }
+}
+
+function observeEntries(type, callback, options) {
+    try {
+        new PerformanceObserver(list => list.getEntries().forEach(callback))
+            .observe(Object.assign({ type: type, buffered: true }, options));
+    } catch (e) {
+        // Entry type not supported by this browser
+    }
+}
+
+if (beaconUrl && window.PerformanceObserver) {
+    let lcp = 0;
+    observeEntries('largest-contentful-paint', entry => {
+        lcp = entry.startTime;
+    });
+
+    // CLS is the largest burst of shifts less than 1 s apart within 5 s
+    let cls = 0;
+    let burst = 0;
+    let burstStart = 0;
+    let lastShift = 0;
+    observeEntries('layout-shift', entry => {
+        if (entry.hadRecentInput) {
+            return;
+        }
+        if (entry.startTime - lastShift > 1000 || entry.startTime - burstStart > 5000) {
+            burst = 0;
+            burstStart = entry.startTime;
+        }
+        burst += entry.value;
+        lastShift = entry.startTime;
+        cls = Math.max(cls, burst);
+    });
+
+    // INP as the slowest interaction, which it equals below 50 interactions per page
+    let inp = -1;
+    observeEntries('event', entry => {
+        if (entry.interactionId) {
+            inp = Math.max(inp, entry.duration);
+        }
+    }, { durationThreshold: 16 });
+    observeEntries('first-input', entry => {
+        inp = Math.max(inp, entry.duration);
+    });
+
+    observeEntries('longtask', entry => {
+        recordMetric('long_task', entry.duration);
+    });
+
+    // Vitals are final once the page is first hidden; later batches only carry long tasks
+    let vitalsSent = false;
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState !== 'hidden') {
+            return;
+        }
+        if (!vitalsSent) {
+            vitalsSent = true;
+            if (lcp) {
+                recordMetric('lcp', lcp);
+            }
+            recordMetric('cls', cls);
+            if (inp >= 0) {
+                recordMetric('inp', inp);
+            }
+        }
+        flushBeacon();
+    });
+    window.addEventListener('pagehide', flushBeacon);
+}
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Structured rewrite of JSON-LD schema blocks
+"""
+
+import json
+import re
+from pathlib import Path
+
+from site_data import BUSINESS, LOCATIONS
+
+SCRIPT_OPEN = re.compile(r'<script type="application/ld\+json">', re.IGNORECASE)
+SCRIPT_CLOSE = '</script>'
+
+# Fields every PostalAddress must carry
+ADDRESS_FIELDS = ['streetAddress', 'addressLocality', 'addressRegion', 'postalCode']
+
+def business_profile(business=BUSINESS):
+    """Schema fields by @type for the business's own address and coordinates"""
+    return {
+        'PostalAddress': {
+            'streetAddress': business['street'],
+            'addressLocality': business['city'],
+            'addressRegion': business['state'],
+            'postalCode': business['zip'],
+        },
+        'GeoCoordinates': {
+            'latitude': business['latitude'],
+            'longitude': business['longitude'],
+        },
+    }
+
+def location_profile(info, business=BUSINESS):
+    """Schema fields by @type for a location page; the street is left as it is"""
+    city, _, state = info['city'].partition(', ')
+    return {
+        'PostalAddress': {
+            'addressLocality': city,
+            'addressRegion': state or business['state'],
+            'postalCode': info['zip'],
+        },
+    }
+
+def page_profile(file_path, business=BUSINESS, locations=LOCATIONS):
+    """Location profile for location pages, the business profile for every other page"""
+    path = Path(file_path)
+    if path.parent.name == 'locations' and path.name in locations:
+        return location_profile(locations[path.name], business)
+    return business_profile(business)
+
+def find_blocks(content):
+    """Yield (start, end) of the JSON text inside each JSON-LD script tag"""
+    pos = 0
+    while True:
+        opener = SCRIPT_OPEN.search(content, pos)
+        if opener is None:
+            return
+        end = content.find(SCRIPT_CLOSE, opener.end())
+        if end < 0:
+            return
+        yield opener.end(), end
+        pos = end + len(SCRIPT_CLOSE)
+
+def schema_nodes(data):
+    """Every JSON object in a parsed schema, depth first"""
+    if isinstance(data, dict):
+        yield data
+        for value in data.values():
+            yield from schema_nodes(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from schema_nodes(value)
+
+def update_schema(data, profile):
+    """Set the profile's fields by @type and key, in place; True if anything changed"""
+    changed = False
+    for node in schema_nodes(data):
+        fields = profile.get(node.get('@type'), {})
+        for key, value in fields.items():
+            if key in node and node[key] != value:
+                node[key] = value
+                changed = True
+    return changed
+
+def validate_schema(data):
+    """Raise ValueError describing every structural problem in a schema"""
+    problems = []
+    top_level = data if isinstance(data, list) else [data]
+    for item in top_level:
+        if not isinstance(item, dict):
+            problems.append('top-level value is not an object')
+            continue
+        if 'schema.org' not in str(item.get('@context', '')):
+            problems.append('missing schema.org @context')
+    for node in schema_nodes(data):
+        node_type = node.get('@type')
+        if node_type == 'PostalAddress':
+            for key in ADDRESS_FIELDS:
+                if not isinstance(node.get(key), str) or not node[key]:
+                    problems.append(f'PostalAddress.{key} is missing or empty')
+        elif node_type == 'GeoCoordinates':
+            for key, limit in (('latitude', 90), ('longitude', 180)):
+                value = node.get(key)
+                if not isinstance(value, (int, float)) or not -limit <= value <= limit:
+                    problems.append(f'GeoCoordinates.{key} is not a number within ±{limit}')
+        elif node_type == 'LocalBusiness':
+            for key in ('name', 'address'):
+                if key not in node:
+                    problems.append(f'LocalBusiness.{key} is missing')
+    if problems:
+        raise ValueError('invalid JSON-LD: ' + '; '.join(problems))
+
+def serialize_like(data, text):
+    """Serialize data in the layout of the original JSON text (one line or indented)"""
+    core = text.strip()
+    if '\n' not in core:
+        return json.dumps(data, ensure_ascii=False)
+    lines = core.splitlines()
+    leading = text[:len(text) - len(text.lstrip())]
+    base = leading[leading.rfind('\n') + 1:]
+    second = lines[1]
+    indent = len(second) - len(second.lstrip()) - len(base)
+    serialized = json.dumps(data, indent=max(indent, 1), ensure_ascii=False)
+    return '\n'.join(line if i == 0 else base + line for i, line in enumerate(serialized.splitlines()))
+
+def rewrite_block(text, profile):
+    """Rewritten JSON text of one block, keeping its surrounding whitespace"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'unparseable JSON-LD: {e}') from None
+    if not update_schema(data, profile):
+        return text
+    validate_schema(data)
+    core = text.strip()
+    start = text.find(core[:1])
+    return text[:start] + serialize_like(data, text) + text[start + len(core):]
+
+def rewrite_json_ld(content, profile, warnings=None):
+    """Update every JSON-LD block from a profile; work scales with the blocks, not the page
+
+    A block that does not parse or would not validate is left as it is and
+    its problem appended to warnings, so the rest of the page still gets
+    rewritten.
+    """
+    parts = []
+    pos = 0
+    for start, end in find_blocks(content):
+        text = content[start:end]
+        try:
+            new_text = rewrite_block(text, profile)
+        except ValueError as e:
+            if warnings is not None:
+                warnings.append(f'JSON-LD block left unchanged: {e}')
+            continue
+        if new_text != text:
+            parts.append(content[pos:start])
+            parts.append(new_text)
+            pos = end
+    if not parts:
+        return content
+    parts.append(content[pos:])
+    return ''.join(parts)
+
+def rewrite_json_ld_stream(chunks, profile, warnings=None):
+    """Streaming rewrite_json_ld; holds back at most one unfinished block"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        # Everything before an unterminated opener (or a possible partial one) is final
+        safe = len(buffer)
+        for opener in SCRIPT_OPEN.finditer(buffer):
+            if buffer.find(SCRIPT_CLOSE, opener.end()) < 0:
+                safe = opener.start()
+                break
+        else:
+            tail = buffer.rfind('<', max(0, len(buffer) - len(SCRIPT_OPEN.pattern)))
+            if tail >= 0 and SCRIPT_CLOSE not in buffer[tail:]:
+                safe = tail
+        if safe:
+            yield rewrite_json_ld(buffer[:safe], profile, warnings)
+            buffer = buffer[safe:]
+    if buffer:
+        yield rewrite_json_ld(buffer, profile, warnings)
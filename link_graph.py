@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Index the site's internal link graph and report links that resolve to no file
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from pathlib import Path
+from urllib.parse import unquote
+
+from file_jobs import add_jobs_argument, map_files
+from site_data import LOCATIONS, SERVICES
+from site_tree import EXCLUDED_DIRS, find_html_files
+
+BASE_DIR = Path(__file__).parent
+INDEX_FILENAME = '.link-index.json'
+INDEX_VERSION = 1
+
+# Pages are read in chunks; a chunk boundary never splits a tag that is scanned
+CHUNK_SIZE = 64 * 1024
+
+LINK_PATTERN = re.compile(r'<[a-zA-Z][^<>]*?\s(href|src)\s*=\s*"([^"]*)"', re.IGNORECASE)
+ID_PATTERN = re.compile(r'<[a-zA-Z][^<>]*?\sid\s*=\s*"([^"]*)"', re.IGNORECASE)
+EXTERNAL = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|//)')
+
+# Broken targets listed per target before the rest are summarized
+SOURCES_SHOWN = 3
+
+def scan_stream(chunks):
+    """([attribute, target, line], ids) for every href/src in one pass over text chunks"""
+    links = []
+    ids = set()
+    buffer = ''
+    line = 1
+    for chunk in chunks:
+        buffer += chunk
+        # Everything before the last '<' is complete; that tag waits for the next chunk
+        safe = buffer.rfind('<')
+        if safe <= 0:
+            continue
+        line = scan_text(buffer[:safe], line, links, ids)
+        buffer = buffer[safe:]
+    scan_text(buffer, line, links, ids)
+    return links, sorted(ids)
+
+def scan_text(text, line, links, ids):
+    """Collect links and ids from complete tags; returns the line number after text"""
+    pos = 0
+    for match in LINK_PATTERN.finditer(text):
+        line += text.count('\n', pos, match.start())
+        pos = match.start()
+        links.append([match.group(1).lower(), match.group(2), line])
+    ids.update(ID_PATTERN.findall(text))
+    return line + text.count('\n', pos)
+
+def read_chunks(file_path):
+    """Yield a text file in CHUNK_SIZE pieces"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+def file_signature(file_path):
+    """(mtime_ns, size) used to skip hashing unchanged files"""
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def file_digest(file_path):
+    """SHA-256 of a file"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def scan_file(item):
+    """Scan one page and return (file_path, signature, digest, links, ids), or links=None on error
+
+    item is (file_path, root-relative page path). Each internal link is stored
+    as [attribute, target, line, resolved path, fragment]; resolution depends
+    only on the page's own path, so it is done once here.
+    """
+    file_path, page = item
+    try:
+        signature = file_signature(file_path)
+        links, ids = scan_stream(read_chunks(file_path))
+    except (OSError, UnicodeDecodeError):
+        return file_path, None, None, None, None
+    resolved_links = []
+    for attribute, target, line in links:
+        resolved = resolve_link(page, target)
+        if resolved is not None:
+            resolved_links.append([attribute, target, line, resolved[0], resolved[1]])
+    return file_path, signature, file_digest(file_path), resolved_links, ids
+
+def find_site_files(base_dir):
+    """Every file a link may point at, as root-relative POSIX paths"""
+    files = set()
+    for root, dirs, names in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS and not d.startswith('.')]
+        rel_root = Path(root).relative_to(base_dir).as_posix()
+        for name in names:
+            files.add(name if rel_root == '.' else f'{rel_root}/{name}')
+    return files
+
+def resolve_link(page, target):
+    """(root-relative path, fragment) a link points at, None for external links, or ('', '') outside the root"""
+    if not target or EXTERNAL.match(target):
+        return None
+    path, _, fragment = target.partition('#')
+    path = unquote(path.partition('?')[0])
+    if not path:
+        return page, fragment
+    if path.startswith('/'):
+        joined = path.lstrip('/')
+    else:
+        joined = posixpath.join(posixpath.dirname(page), path)
+    resolved = posixpath.normpath(joined) if joined else '.'
+    if resolved == '..' or resolved.startswith('../'):
+        return '', ''
+    if resolved == '.' or path.endswith('/'):
+        resolved = 'index.html' if resolved == '.' else f'{resolved}/index.html'
+    return resolved, fragment
+
+class LinkGraph:
+    """Persistent per-page link index, refreshed file by file
+
+    Each page's resolved internal links and element ids are stored with its
+    stat signature and content hash. A page is re-read only when its
+    signature changed, and re-scanned only when its hash changed too. Links
+    are checked on every run against the current file set, one set lookup
+    per link, so adding or deleting a target never needs a rescan.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, filename=INDEX_FILENAME):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / filename
+        self.pages = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('pattern') == LINK_PATTERN.pattern and data.get('version') == INDEX_VERSION:
+                self.pages = data.get('pages', {})
+        except (OSError, ValueError):
+            pass
+        self.files = set()
+        self.dirty = False
+
+    def _key(self, file_path):
+        return Path(file_path).relative_to(self.base_dir).as_posix()
+
+    def stale_files(self, html_files):
+        """Pages whose content changed since they were last indexed"""
+        stale = []
+        for file_path in html_files:
+            entry = self.pages.get(self._key(file_path))
+            try:
+                if entry is not None:
+                    signature = file_signature(file_path)
+                    if entry['signature'] == signature:
+                        continue
+                    if entry['sha256'] == file_digest(file_path):
+                        entry['signature'] = signature
+                        self.dirty = True
+                        continue
+            except OSError:
+                pass
+            stale.append(file_path)
+        return stale
+
+    def refresh(self, jobs=1):
+        """Rescan changed pages, drop deleted ones and reload the file set; returns the number rescanned"""
+        html_files = find_html_files(self.base_dir)
+        keep = {self._key(file_path) for file_path in html_files}
+        if len(keep) != len(self.pages) or not keep.issuperset(self.pages):
+            self.dirty = True
+        self.pages = {key: entry for key, entry in self.pages.items() if key in keep}
+        self.files = find_site_files(self.base_dir)
+
+        stale = self.stale_files(html_files)
+        if stale:
+            self.dirty = True
+        items = [(file_path, self._key(file_path)) for file_path in stale]
+        for file_path, signature, digest, links, ids in map_files(scan_file, items, jobs):
+            key = self._key(file_path)
+            if links is None:
+                self.pages.pop(key, None)
+            else:
+                self.pages[key] = {'signature': signature, 'sha256': digest, 'links': links, 'ids': ids}
+        return len(stale)
+
+    def broken_links(self):
+        """{(target as written, resolved path): [(page, line)]} for links to files that do not exist"""
+        files = self.files
+        broken = {}
+        for page, entry in self.pages.items():
+            for _, target, line, resolved, _ in entry['links']:
+                if resolved not in files:
+                    broken.setdefault((target, resolved), []).append((page, line))
+        return broken
+
+    def missing_anchors(self):
+        """{page#fragment: [(page, line)]} for fragments naming no id in an existing target page"""
+        missing = {}
+        id_sets = {page: set(entry['ids']) for page, entry in self.pages.items()}
+        for page, entry in self.pages.items():
+            for _, _, line, resolved, fragment in entry['links']:
+                if fragment and resolved in id_sets and fragment not in id_sets[resolved]:
+                    missing.setdefault(f'{resolved}#{fragment}', []).append((page, line))
+        return missing
+
+    def inbound(self):
+        """{page: set of other pages linking to it}"""
+        inbound = {}
+        for page, entry in self.pages.items():
+            for link in entry['links']:
+                if link[3] != page:
+                    inbound.setdefault(link[3], set()).add(page)
+        return inbound
+
+    def orphans(self):
+        """Pages no other page links to, apart from the home page"""
+        inbound = self.inbound()
+        return [page for page in sorted(self.pages) if page != 'index.html' and page not in inbound]
+
+    def save(self):
+        """Write the index atomically if anything changed"""
+        if not self.dirty:
+            return
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        # json.dumps, unlike json.dump, runs the whole encoding in C
+        data = json.dumps({
+            'pattern': LINK_PATTERN.pattern,
+            'version': INDEX_VERSION,
+            'pages': self.pages,
+        }, separators=(',', ':'), sort_keys=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+def missing_data_pages(files, locations=LOCATIONS, services=SERVICES):
+    """site_data entries whose page does not exist in the file set"""
+    expected = [f'locations/{name}' for name in locations] + [f'services/{name}' for name in services]
+    return [path for path in expected if path not in files]
+
+def print_problems(title, problems):
+    """Print problem targets with a few of the pages that refer to them"""
+    print(f"{title}: {len(problems)}")
+    for target, sources in sorted(problems.items(), key=lambda item: (-len(item[1]), item[0])):
+        shown = ', '.join(f'{page}:{line}' for page, line in sources[:SOURCES_SHOWN])
+        more = f' and {len(sources) - SOURCES_SHOWN} more' if len(sources) > SOURCES_SHOWN else ''
+        print(f"  {target}  ({len(sources)} refs: {shown}{more})")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--root', type=Path, default=BASE_DIR,
+                        help='page tree to check, e.g. a build or market output directory (default: the site)')
+    parser.add_argument('--anchors', action='store_true', help='also report #fragments that name no id in their page')
+    parser.add_argument('--orphans', action='store_true', help='also list pages no other page links to')
+    parser.add_argument('--rebuild', action='store_true', help=f'ignore {INDEX_FILENAME} and rescan every page')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if any link is broken')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = LinkGraph(args.root)
+    if args.rebuild:
+        graph.pages = {}
+        graph.dirty = True
+    rescanned = graph.refresh(args.jobs)
+    graph.save()
+    broken = {}
+    for (target, resolved), sources in graph.broken_links().items():
+        label = target if target == resolved else f'{target} -> {resolved or "(outside the site)"}'
+        broken[label] = sources
+    elapsed = time.perf_counter() - started
+
+    print_problems("Broken links", broken)
+    missing = missing_data_pages(graph.files)
+    if missing:
+        print(f"site_data entries without a page: {', '.join(missing)}")
+    if args.anchors:
+        print_problems("Missing anchors", graph.missing_anchors())
+    if args.orphans:
+        orphans = graph.orphans()
+        print(f"Orphan pages: {len(orphans)}" + ''.join(f'\n  {page}' for page in orphans))
+    links = sum(len(entry['links']) for entry in graph.pages.values())
+    print(f"\nChecked {links} internal links in {len(graph.pages)} pages ({rescanned} rescanned) in {elapsed * 1000:.1f} ms.")
+
+    if args.check and broken:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Generate one location page per town in the service radius, each with its nearest areas precomputed
+"""
+
+import argparse
+import csv
+import html
+import math
+import random
+import re
+import time
+from array import array
+from pathlib import Path
+from string import Template
+
+from build_site import (DEFAULT_OUTPUT_DIR, LIST_LINK, build_schema, format_schema, load_template, page_context,
+                        write_if_changed)
+from markets import STATE_NAMES
+from search_index import build_search_index
+from site_data import BUSINESS, LOCATIONS
+from sitemap import generate_sitemap
+
+BASE_DIR = Path(__file__).parent
+TOWNS_FILE = BASE_DIR / 'towns.example.csv'
+
+DEFAULT_RADIUS_MILES = 60
+NEARBY_COUNT = 6
+
+# Towns per grid cell the index aims for; cells are sized from the data's density
+TOWNS_PER_CELL = 4
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = math.pi * EARTH_RADIUS_MILES / 180
+
+def distance_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+class TownStore:
+    """Array-backed town table
+
+    Coordinates and zip codes live in typed arrays, state codes in one bytes
+    object and names in a single NUL-joined string with an offset array, so
+    a town is an integer index and 100k towns cost a few megabytes.
+    """
+
+    def __init__(self, rows):
+        names = []
+        states = bytearray()
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.zips = array('I')
+        for name, state, zip_code, latitude, longitude in rows:
+            names.append(name)
+            states += state.upper().encode('ascii')[:2].ljust(2)
+            self.zips.append(int(zip_code))
+            self.latitudes.append(float(latitude))
+            self.longitudes.append(float(longitude))
+        self.states = bytes(states)
+        self._names = '\0'.join(names)
+        self._offsets = array('I', [0])
+        for name in names:
+            self._offsets.append(self._offsets[-1] + len(name) + 1)
+
+    @classmethod
+    def load_csv(cls, path):
+        """Towns from a CSV with town, state, zip, latitude and longitude columns"""
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            missing = {'town', 'state', 'zip', 'latitude', 'longitude'} - set(reader.fieldnames or [])
+            if missing:
+                raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+            return cls((row['town'], row['state'], row['zip'], row['latitude'], row['longitude']) for row in reader)
+
+    @classmethod
+    def synthetic(cls, count, center, radius, seed=0):
+        """count made-up towns spread evenly over a disc, for benchmarking"""
+        rng = random.Random(seed)
+        rows = []
+        for number in range(count):
+            miles = radius * math.sqrt(rng.random())
+            bearing = rng.random() * 2 * math.pi
+            latitude = center[0] + miles * math.cos(bearing) / MILES_PER_DEGREE
+            longitude = center[1] + miles * math.sin(bearing) / (MILES_PER_DEGREE * math.cos(math.radians(center[0])))
+            rows.append((f'Town {number + 1}', rng.choice(['OH', 'WV']), 40000 + number % 10000, latitude, longitude))
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.zips)
+
+    def name(self, index):
+        """Town name"""
+        return self._names[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def state(self, index):
+        """Two-letter state code"""
+        return self.states[2 * index:2 * index + 2].decode('ascii').strip()
+
+    def zip_code(self, index):
+        """Five-digit zip code"""
+        return f'{self.zips[index]:05d}'
+
+    def point(self, index):
+        """(latitude, longitude)"""
+        return self.latitudes[index], self.longitudes[index]
+
+class GridIndex:
+    """Uniform latitude/longitude grid over a subset of a TownStore
+
+    Nearest-neighbour queries walk rings of cells outward from the query
+    cell and stop once no unvisited cell can hold anything closer than the
+    k-th town found so far.
+    """
+
+    def __init__(self, store, indices, towns_per_cell=TOWNS_PER_CELL):
+        indices = list(indices)
+        self.store = store
+        self.cell = self.cell_size(store, indices, towns_per_cell)
+        self.cells = {}
+        for index in indices:
+            self.cells.setdefault(self._cell(*store.point(index)), array('I')).append(index)
+        rows = [row for row, _ in self.cells] or [0]
+        # A cell's narrowest width is its longitude span at the latitude farthest from the equator
+        widest_latitude = max(abs(row) + 1 for row in rows) * self.cell
+        self.min_cell_miles = self.cell * MILES_PER_DEGREE * math.cos(math.radians(min(widest_latitude, 89)))
+        cols = [col for _, col in self.cells] or [0]
+        self.max_ring = max(max(rows) - min(rows), max(cols) - min(cols)) + 1
+
+    @staticmethod
+    def cell_size(store, indices, towns_per_cell):
+        """Cell edge in degrees giving about towns_per_cell towns per cell over the indices' bounding box"""
+        if len(indices) < 2:
+            return 1.0
+        latitudes = [store.latitudes[index] for index in indices]
+        longitudes = [store.longitudes[index] for index in indices]
+        area = max(max(latitudes) - min(latitudes), 0.01) * max(max(longitudes) - min(longitudes), 0.01)
+        return min(1.0, max(0.001, math.sqrt(area * towns_per_cell / len(indices))))
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell), math.floor(longitude / self.cell)
+
+    def _ring(self, row, col, ring):
+        """Cells exactly ring steps from (row, col)"""
+        if ring == 0:
+            yield row, col
+            return
+        for d in range(-ring, ring + 1):
+            yield row - ring, col + d
+            yield row + ring, col + d
+        for d in range(-ring + 1, ring):
+            yield row + d, col - ring
+            yield row + d, col + ring
+
+    def nearest(self, latitude, longitude, k, exclude=None):
+        """[(miles, index)] of the k towns closest to a point, nearest first"""
+        row, col = self._cell(latitude, longitude)
+        found = []
+        for ring in range(self.max_ring + 1):
+            if len(found) >= k and found[k - 1][0] <= (ring - 1) * self.min_cell_miles:
+                break
+            for cell in self._ring(row, col, ring):
+                for index in self.cells.get(cell, ()):
+                    if index != exclude:
+                        found.append((distance_miles(latitude, longitude, *self.store.point(index)), index))
+            found.sort()
+            del found[k:]
+        return found
+
+    def within(self, latitude, longitude, miles):
+        """[(miles, index)] of every town within a radius of a point, nearest first"""
+        reach = math.ceil(miles / self.min_cell_miles)
+        row, col = self._cell(latitude, longitude)
+        found = []
+        for ring in range(reach + 2):
+            for cell in self._ring(row, col, ring):
+                for index in self.cells.get(cell, ()):
+                    distance = distance_miles(latitude, longitude, *self.store.point(index))
+                    if distance <= miles:
+                        found.append((distance, index))
+        return sorted(found)
+
+def slugify(text):
+    """Lower-case, hyphen-separated form of a town name"""
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+def page_names(store, towns):
+    """{index: file name}, adding the zip code where a town name repeats within a state"""
+    names = {}
+    used = set(LOCATIONS)
+    for index in towns:
+        name = f'{slugify(store.name(index))}-{store.state(index).lower()}.html'
+        if name in used:
+            name = f'{name[:-5]}-{store.zip_code(index)}.html'
+        used.add(name)
+        names[index] = name
+    return names
+
+# Context fields that differ from one generated page to the next
+TOWN_FIELDS = ['title', 'description', 'schema', 'banner_area', 'body', 'town', 'state', 'town_state_name',
+               'town_zip', 'distance', 'nearby_list']
+
+def town_templates(business=BUSINESS):
+    """head, header, location and footer partials with every field shared by all towns already filled in
+
+    page_context is run once for a placeholder page; render_town then only
+    substitutes TOWN_FIELDS. Shared values have '$' doubled so the second
+    substitution restores them unchanged.
+    """
+    page = {'rel_path': Path('locations') / 'index.html', 'kind': 'page', 'body': '', 'metadata': {}}
+    shared = {key: str(value).replace('$', '$$') for key, value in page_context(page, business).items()
+              if key not in TOWN_FIELDS}
+    return {name: Template(load_template(name).safe_substitute(shared))
+            for name in ('head', 'header', 'location', 'footer')}
+
+def render_town(store, index, distance, nearby, names, templates, business=BUSINESS):
+    """Full page for one town from the shared partials and the location body template
+
+    Names from the town data are HTML-escaped everywhere but the JSON-LD,
+    which gets them as JSON.
+    """
+    raw_town, raw_state = store.name(index), store.state(index)
+    info = {'city': f'{raw_town}, {raw_state}', 'zip': store.zip_code(index)}
+    town, state = html.escape(raw_town), html.escape(raw_state)
+    state_name = html.escape(STATE_NAMES.get(raw_state, raw_state))
+    context = {
+        'title': f'{town} {state} Ductless Mini Splits & HVAC Services | {business["brand"]}',
+        'description': f'Ductless mini split installation, HVAC repair and 24/7 emergency service in '
+                       f'{town}, {state_name}. Call {business["phone_display"]} for a free estimate.',
+        # '</' would end the script element early
+        'schema': format_schema(build_schema('location', info, business)).replace('</', '<\\/'),
+        'banner_area': f" in {town}, {state}",
+        'town': town,
+        'state': state,
+        'town_state_name': state_name,
+        'town_zip': info['zip'],
+        'distance': f'{distance:.0f}',
+        'nearby_list': '\n'.join(
+            LIST_LINK.substitute(href=names[other],
+                                 label=f'{html.escape(store.name(other))}, {html.escape(store.state(other))} ({miles:.1f} mi)')
+            for miles, other in nearby
+        ),
+    }
+    return ''.join([
+        templates['head'].substitute(context),
+        templates['header'].substitute(context),
+        templates['location'].substitute(context),
+        templates['footer'].substitute(context),
+    ])
+
+def generate_pages(store, output_dir, center, radius=DEFAULT_RADIUS_MILES, nearby_count=NEARBY_COUNT):
+    """Write a page for every town within radius of center; returns (towns, written, timings)"""
+    timings = {}
+    started = time.perf_counter()
+    everything = GridIndex(store, range(len(store)))
+    area = everything.within(center[0], center[1], radius)
+    towns = [index for _, index in area]
+    index = GridIndex(store, towns)
+    names = page_names(store, towns)
+    timings['index'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    nearby = {town: index.nearest(*store.point(town), nearby_count, exclude=town) for town in towns}
+    timings['nearby'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    written = 0
+    templates = town_templates()
+    output_dir = Path(output_dir) / 'locations'
+    for distance, town in area:
+        page = render_town(store, town, distance, nearby[town], names, templates)
+        if write_if_changed(output_dir / names[town], page):
+            written += 1
+    timings['render'] = time.perf_counter() - started
+    return len(towns), written, timings
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        epilog='Generate into a built tree (build_site.py) with --sitemap and --search-index so the pages are '
+               'listed and searchable, then run asset_pipeline.py and compress_pipeline.py over the tree.')
+    parser.add_argument('towns', type=Path, nargs='?', default=TOWNS_FILE,
+                        help=f'CSV with town, state, zip, latitude, longitude columns (default: {TOWNS_FILE.name})')
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'site output directory; pages go in its locations/ (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    parser.add_argument('--radius', type=float, default=DEFAULT_RADIUS_MILES, metavar='MILES',
+                        help=f'service radius around the business (default: {DEFAULT_RADIUS_MILES})')
+    parser.add_argument('--nearby', type=int, default=NEARBY_COUNT, metavar='N',
+                        help=f'nearby areas listed on each page (default: {NEARBY_COUNT})')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='ignore the CSV and generate N random towns in the radius')
+    parser.add_argument('--sitemap', action='store_true',
+                        help='regenerate the output tree\'s sitemap afterwards so it lists the new pages')
+    parser.add_argument('--search-index', action='store_true',
+                        help='rebuild the output tree\'s search index afterwards so the new pages are searchable')
+    args = parser.parse_args()
+
+    center = (BUSINESS['latitude'], BUSINESS['longitude'])
+    started = time.perf_counter()
+    if args.synthetic:
+        store = TownStore.synthetic(args.synthetic, center, args.radius)
+    else:
+        try:
+            store = TownStore.load_csv(args.towns)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    loaded = time.perf_counter() - started
+
+    towns, written, timings = generate_pages(store, args.output, center, args.radius, args.nearby)
+    print(f"Loaded {len(store)} towns in {loaded * 1000:.0f} ms; {towns} within {args.radius:g} miles.")
+    print(f"Index {timings['index'] * 1000:.0f} ms, nearby areas {timings['nearby'] * 1000:.0f} ms, "
+          f"render {timings['render'] * 1000:.0f} ms; wrote {written} pages to {args.output / 'locations'}.")
+    if args.sitemap:
+        count, files = generate_sitemap(args.output)
+        print(f"Mapped {count} pages into {', '.join(files) if files else 'the unchanged sitemap'}.")
+    if args.search_index:
+        pages, shards, _, total, _ = build_search_index(args.output)
+        print(f"Indexed {pages} pages for search ({shards} shards, {total / 1024:.1f} KB).")
+
+if __name__ == "__main__":
+    main()
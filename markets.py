@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Generate one city-branded site variant per market profile in a single run
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from build_site import ASSETS, BASE_DIR, copy_assets, parse_page, render_parsed, write_if_changed
+from rewrite_engine import LITERAL, RewriteEngine
+from site_data import BUSINESS, LOCATIONS, SERVICES
+from site_tree import find_html_files
+from sitemap import SITE_URL, generate_sitemap
+
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build' / 'markets'
+
+# The base site's crawler files name its own domain; each market gets its own instead
+CRAWLER_FILES = ('robots.txt', 'sitemap.xml')
+MARKET_ASSETS = [name for name in ASSETS if name not in CRAWLER_FILES]
+
+STATE_NAMES = {
+    'OH': 'Ohio',
+    'WV': 'West Virginia',
+    'PA': 'Pennsylvania',
+    'KY': 'Kentucky',
+}
+
+# Parsed source pages and market profiles, set once per worker. With the fork
+# start method workers share the parent's copy instead of unpickling one.
+_SOURCE_PAGES = None
+_MARKETS = None
+_OUTPUT_DIR = None
+
+def load_markets(path):
+    """Load a JSON list of market profiles; each needs at least slug, city and state"""
+    with open(path, 'r', encoding='utf-8') as f:
+        markets = json.load(f)
+    for market in markets:
+        for field in ('slug', 'city', 'state'):
+            if field not in market:
+                raise ValueError(f"Market profile {market!r} is missing '{field}'")
+    return markets
+
+def market_business(market):
+    """Business profile for a market, filling unset fields from the city and slug"""
+    handle = market['slug'].replace('-', '') + 'ductless'
+    business = dict(BUSINESS)
+    business.update({
+        'name': f"{market['city']} {market['state']} Ductless Mini Splits",
+        'brand': f"{market['city']} Ductless Pro",
+        'state_name': STATE_NAMES.get(market['state'], market['state']),
+        'domain': f'{handle}.com',
+        'email': f'info@{handle}.com',
+        'facebook': f'https://www.facebook.com/{handle}',
+        'instagram': f'https://www.instagram.com/{handle}',
+    })
+    business.update(market)
+    return business
+
+def market_url(business):
+    """Public URL of a market variant: its profile's site_url, or its domain"""
+    return business.get('site_url', f"https://{business['domain']}")
+
+def address(business):
+    """One-line street address of a business profile"""
+    return f"{business['street']}, {business['city']}, {business['state']} {business['zip']}"
+
+def identity_rules(business):
+    """Literal rules that move the base business's name, handles and address to a market
+
+    These are safe on every page and on the location table: the base
+    market's town and zip code stay a served location like any other.
+    """
+    base_handle = BUSINESS['domain'].rsplit('.', 1)[0]
+    handle = business['domain'].rsplit('.', 1)[0]
+    pairs = [
+        (address(BUSINESS), address(business)),
+        (BUSINESS['name'], business['name']),
+        (BUSINESS['brand'], business['brand']),
+        (base_handle, handle),
+        (BUSINESS['street'], business['street']),
+    ]
+    return [(LITERAL, old, new) for old, new in pairs if old != new]
+
+def market_rules(business):
+    """identity_rules plus the "City, State" phrases that place the business, for non-location pages
+
+    The bare town name and zip code are left alone, since they also name
+    the base town's own location page in lists and service areas.
+    """
+    pairs = [
+        (f"{BUSINESS['city']}, {BUSINESS['state_name']}", f"{business['city']}, {business['state_name']}"),
+        (f"{BUSINESS['city']}, {BUSINESS['state']}", f"{business['city']}, {business['state']}"),
+        (f"{BUSINESS['city']} {BUSINESS['state']}", f"{business['city']} {business['state']}"),
+    ]
+    return identity_rules(business) + [(LITERAL, old, new) for old, new in pairs if old != new]
+
+def market_robots(business, base_dir=BASE_DIR):
+    """The base robots.txt with its Sitemap line pointing at the market's own sitemap"""
+    with open(base_dir / 'robots.txt', 'r', encoding='utf-8') as f:
+        return f.read().replace(f'{SITE_URL}/sitemap.xml', f'{market_url(business)}/sitemap.xml')
+
+def rebrand_table(table, engine):
+    """Copy of a SERVICES/LOCATIONS table with every string value rewritten"""
+    return {
+        filename: {key: engine.rewrite(value) if isinstance(value, str) else value
+                   for key, value in info.items()}
+        for filename, info in table.items()
+    }
+
+def read_source_pages(base_dir=BASE_DIR):
+    """Read and parse the source tree once"""
+    pages = []
+    for file_path in find_html_files(base_dir):
+        rel_path = Path(file_path).relative_to(base_dir)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            page = parse_page(rel_path, f.read())
+        if page is not None:
+            pages.append(page)
+    return pages
+
+def _init_worker(pages, markets, output_dir):
+    global _SOURCE_PAGES, _MARKETS, _OUTPUT_DIR
+    _SOURCE_PAGES = pages
+    _MARKETS = markets
+    _OUTPUT_DIR = output_dir
+
+def build_market(index):
+    """Render every source page for one market into its own directory, with its own sitemap and robots.txt
+
+    Location pages and the location table only get the identity rules, so
+    the base town keeps its own page and nav entry.
+    """
+    started = time.perf_counter()
+    market = _MARKETS[index]
+    business = market_business(market)
+    engine = RewriteEngine(market_rules(business))
+    identity = RewriteEngine(identity_rules(business))
+    services = rebrand_table(SERVICES, engine)
+    locations = rebrand_table(LOCATIONS, identity)
+    output_dir = Path(_OUTPUT_DIR) / market['slug']
+
+    written = 0
+    for page in _SOURCE_PAGES:
+        page = dict(page)
+        rules = identity if page['kind'] == 'location' else engine
+        page['body'] = rules.rewrite(page['body'])
+        page['metadata'] = {key: rules.rewrite(value) for key, value in page['metadata'].items()}
+        html = render_parsed(page, business, services, locations)
+        if write_if_changed(output_dir / page['rel_path'], html):
+            written += 1
+    copy_assets(output_dir, names=MARKET_ASSETS)
+    write_if_changed(output_dir / 'robots.txt', market_robots(business))
+    generate_sitemap(output_dir, market_url(business))
+    return market['slug'], len(_SOURCE_PAGES), written, time.perf_counter() - started
+
+def build_markets(markets, output_dir, jobs=1):
+    """Build every market variant and yield per-market results in input order"""
+    pages = read_source_pages()
+    if jobs <= 1:
+        _init_worker(pages, markets, output_dir)
+        for index in range(len(markets)):
+            yield build_market(index)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=_init_worker,
+                             initargs=(pages, markets, output_dir)) as executor:
+        yield from executor.map(build_market, range(len(markets)))
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('markets', type=Path, help='JSON file with a list of market profiles')
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help='directory that receives one subdirectory per market')
+    parser.add_argument('--jobs', '-j', type=int, default=multiprocessing.cpu_count(), metavar='N',
+                        help='number of worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    markets = load_markets(args.markets)
+    print(f"Building {len(markets)} market variants...")
+    for slug, page_count, written, elapsed in build_markets(markets, args.output, args.jobs):
+        print(f"Built {slug}: {page_count} pages, {written} written in {elapsed * 1000:.1f} ms")
+
+    print(f"\nCompleted! Built {len(markets)} market sites into {args.output} "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Audit page weight and render-blocking resources against performance budgets
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+from functools import lru_cache
+from html.parser import HTMLParser
+from pathlib import Path
+
+from file_jobs import add_jobs_argument, map_files
+from link_graph import resolve_link
+from site_tree import find_html_files, page_kind
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_REPORT = 'perf-budget.json'
+
+# Maximum per page for each metric; a budgets file or --budget overrides these
+DEFAULT_BUDGETS = {
+    'html_gzip_bytes': 40 * 1024,
+    'transfer_gzip_bytes': 500 * 1024,
+    'render_blocking': 1,
+    'third_party_scripts': 0,
+    'image_bytes': 400 * 1024,
+    'images_without_dimensions': 0,
+    'dom_nodes': 1500,
+    'inline_script_bytes': 1024,
+}
+
+# Text resources are counted at their gzip size, everything else as stored
+TEXT_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.xml'}
+
+DATA_SCRIPT_TYPES = {'application/ld+json', 'application/json', 'text/template'}
+
+class PageAudit(HTMLParser):
+    """Single pass over a page collecting element counts, head resources, scripts and images"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.dom_nodes = 0
+        self.in_head = False
+        self.in_noscript = False
+        self.script = None
+        self.blocking = []
+        self.third_party = []
+        self.inline_script_bytes = 0
+        self.resources = []
+        self.images = []
+
+    def handle_starttag(self, tag, attrs):
+        self.dom_nodes += 1
+        attrs = dict(attrs)
+        if tag == 'head':
+            self.in_head = True
+        elif tag == 'body':
+            self.in_head = False
+        elif tag == 'noscript':
+            self.in_noscript = True
+        elif tag == 'link' and not self.in_noscript:
+            rel = (attrs.get('rel') or '').lower().split()
+            href = attrs.get('href')
+            if 'stylesheet' in rel and href:
+                self.resources.append(href)
+                if self.in_head and attrs.get('media', 'all') not in ('print', 'not all') and 'onload' not in attrs:
+                    self.blocking.append(f'stylesheet {href}')
+            elif 'preload' in rel and href:
+                self.resources.append(href)
+        elif tag == 'script':
+            src = attrs.get('src')
+            script_type = (attrs.get('type') or '').lower()
+            deferred = 'async' in attrs or 'defer' in attrs or script_type == 'module'
+            if src:
+                self.resources.append(src)
+                if src.startswith(('http://', 'https://', '//')):
+                    self.third_party.append(src)
+                if self.in_head and not deferred:
+                    self.blocking.append(f'script {src}')
+                self.script = None
+            elif script_type not in DATA_SCRIPT_TYPES:
+                self.script = 'head' if self.in_head else 'body'
+        elif tag == 'img':
+            src = attrs.get('src')
+            if src:
+                self.resources.append(src)
+                self.images.append((src, 'width' in attrs and 'height' in attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.in_head = False
+        elif tag == 'noscript':
+            self.in_noscript = False
+        elif tag == 'script':
+            self.script = None
+
+    def handle_data(self, data):
+        if self.script is None:
+            return
+        size = len(data.encode('utf-8'))
+        self.inline_script_bytes += size
+        if self.script == 'head' and data.strip():
+            # An inline script in <head> holds up parsing like a synchronous one
+            self.blocking.append(f'inline script ({size} bytes)')
+            self.script = 'counted'
+
+@lru_cache(maxsize=4096)
+def resource_size(path, mtime_ns):
+    """(raw bytes, transfer bytes) of a local file; mtime_ns keys the cache"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if os.path.splitext(path)[1] in TEXT_EXTENSIONS:
+        return len(data), len(gzip.compress(data, mtime=0))
+    return len(data), len(data)
+
+def local_size(root, page, target):
+    """(raw, transfer) bytes of a page resource inside root, or None if it is remote or missing"""
+    resolved = resolve_link(page, target)
+    if resolved is None or not resolved[0]:
+        return None
+    path = os.path.join(root, resolved[0])
+    try:
+        return resource_size(path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+
+def audit_page(item):
+    """Metrics and head resources for one page; item is (file_path, root)"""
+    file_path, root = item
+    page = Path(file_path).relative_to(root).as_posix()
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    parser = PageAudit()
+    parser.feed(data.decode('utf-8'))
+    parser.close()
+
+    html_gzip = len(gzip.compress(data, mtime=0))
+    transfer_raw, transfer_gzip = len(data), html_gzip
+    image_bytes = 0
+    images = {src for src, _ in parser.images}
+    for target in dict.fromkeys(parser.resources):
+        size = local_size(root, page, target)
+        if size is None:
+            continue
+        transfer_raw += size[0]
+        transfer_gzip += size[1]
+        if target in images:
+            image_bytes += size[0]
+
+    metrics = {
+        'html_bytes': len(data),
+        'html_gzip_bytes': html_gzip,
+        'transfer_bytes': transfer_raw,
+        'transfer_gzip_bytes': transfer_gzip,
+        'render_blocking': len(parser.blocking),
+        'third_party_scripts': len(parser.third_party),
+        'image_bytes': image_bytes,
+        'images_without_dimensions': sum(1 for _, sized in parser.images if not sized),
+        'dom_nodes': parser.dom_nodes,
+        'inline_script_bytes': parser.inline_script_bytes,
+    }
+    details = {'render_blocking': parser.blocking, 'third_party_scripts': parser.third_party}
+    return page, metrics, details
+
+def load_budgets(path=None, overrides=()):
+    """{'default': budgets, kind: budgets} from DEFAULT_BUDGETS, a JSON file and NAME=VALUE overrides
+
+    The file holds metric maxima at the top level and optional per-template
+    maxima under 'index', 'service', 'location' or 'page'.
+    """
+    budgets = {'default': dict(DEFAULT_BUDGETS)}
+    if path is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for key, value in data.items():
+            if isinstance(value, dict):
+                budgets[key] = value
+            else:
+                budgets['default'][key] = value
+    for override in overrides:
+        name, _, value = override.partition('=')
+        budgets['default'][name] = int(value)
+    unknown = {name for section in budgets.values() for name in section} - set(DEFAULT_BUDGETS)
+    if unknown:
+        raise ValueError(f"unknown budget metric(s): {', '.join(sorted(unknown))}")
+    return budgets
+
+def page_budgets(budgets, kind):
+    """Budgets that apply to one page template"""
+    return {**budgets['default'], **budgets.get(kind, {})}
+
+def violations(metrics, budgets):
+    """{metric: [value, budget]} for every metric over its budget"""
+    return {name: [metrics[name], limit] for name, limit in budgets.items() if metrics[name] > limit}
+
+def template_summary(pages):
+    """Per-template page counts, failing pages, and median and max of every metric"""
+    by_kind = {}
+    for entry in pages.values():
+        by_kind.setdefault(entry['template'], []).append(entry)
+    summary = {}
+    for kind, entries in sorted(by_kind.items()):
+        summary[kind] = {
+            'pages': len(entries),
+            'failing': sum(1 for entry in entries if entry['violations']),
+            'median': {name: statistics.median(entry['metrics'][name] for entry in entries)
+                       for name in entries[0]['metrics']},
+            'max': {name: max(entry['metrics'][name] for entry in entries) for name in entries[0]['metrics']},
+        }
+    return summary
+
+def audit_site(root=BASE_DIR, budgets=None, jobs=1):
+    """Audit every page under root; returns the report dict"""
+    root = Path(root)
+    budgets = budgets or load_budgets()
+    items = [(file_path, str(root)) for file_path in find_html_files(root)]
+    pages = {}
+    for page, metrics, details in map_files(audit_page, items, jobs):
+        kind = page_kind(Path(page))
+        pages[page] = {
+            'template': kind,
+            'metrics': metrics,
+            'details': details,
+            'violations': violations(metrics, page_budgets(budgets, kind)),
+        }
+    return {'budgets': budgets, 'templates': template_summary(pages), 'pages': pages}
+
+def print_summary(report):
+    """Print the per-template summary and a line per budget exceeded"""
+    templates = report['templates']
+    headings = [f"{kind} ({summary['failing']}/{summary['pages']} failing)" for kind, summary in templates.items()]
+    print(f"{'max / budget':<28}" + ''.join(f'{heading:>30}' for heading in headings))
+    for name in DEFAULT_BUDGETS:
+        cells = ''
+        for kind, summary in templates.items():
+            limit = page_budgets(report['budgets'], kind)[name]
+            flag = ' !' if summary['max'][name] > limit else '  '
+            cells += f"{summary['max'][name]:>17,} / {limit:<8,}{flag}"
+        print(f"{name:<28}{cells}")
+
+    exceeded = {}
+    for page, entry in report['pages'].items():
+        for name in entry['violations']:
+            exceeded.setdefault(name, []).append(page)
+    if exceeded:
+        print("\nBudgets exceeded (max / budget above):")
+        for name, failing in exceeded.items():
+            print(f"  {name}: {len(failing)} pages, e.g. {failing[0]}")
+            details = report['pages'][failing[0]]['details'].get(name)
+            for detail in details or []:
+                print(f"    {detail}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--root', type=Path, default=BASE_DIR,
+                        help='page tree to audit, e.g. a build output directory (default: the site)')
+    parser.add_argument('--budgets', type=Path, metavar='FILE',
+                        help='JSON budgets: metric maxima, optionally per template (index/service/location/page)')
+    parser.add_argument('--budget', action='append', default=[], metavar='METRIC=MAX',
+                        help='override one default budget, e.g. dom_nodes=1200 (repeatable)')
+    parser.add_argument('--report', '-o', default=DEFAULT_REPORT, help=f'JSON report path (default: {DEFAULT_REPORT})')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+    try:
+        budgets = load_budgets(args.budgets, args.budget)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    report = audit_site(args.root, budgets, args.jobs)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    failing = sum(1 for entry in report['pages'].values() if entry['violations'])
+    print(f"\n{len(report['pages'])} pages audited, {failing} over budget. Report written to {args.report}")
+    if failing:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
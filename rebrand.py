@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Run the full rebrand (update_content, final_update, fix_navigation) with one read and one write per page
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from file_jobs import ERROR, UNCHANGED, UPDATED, add_jobs_argument, map_files
+from final_update import LOCATION_INFO, SERVICE_INFO, apply_location_info, apply_service_info, clean_up_content
+from fix_navigation import update_navigation_content
+from update_content import BASE_DIR, find_html_files, rewrite_content, with_warnings
+from watch_files import DEFAULT_DEBOUNCE, watch
+
+def stage_global(content, file_path, warnings):
+    """Schema addresses, then global brand, address and service-area replacements"""
+    return rewrite_content(content, file_path, warnings)
+
+def stage_metadata(content, file_path, warnings):
+    """SERVICE_INFO / LOCATION_INFO titles, meta tags and hero text"""
+    path = Path(file_path)
+    if path.parent.name == 'services' and path.name in SERVICE_INFO:
+        return apply_service_info(content, SERVICE_INFO[path.name])
+    if path.parent.name == 'locations' and path.name in LOCATION_INFO:
+        return apply_location_info(content, LOCATION_INFO[path.name])
+    return content
+
+def stage_cleanup(content, file_path, warnings):
+    """Final cleanup of leftover source-market references"""
+    return clean_up_content(content)
+
+def stage_navigation(content, file_path, warnings):
+    """Navigation dropdown and location reference rewrite"""
+    return update_navigation_content(content, file_path)
+
+# Same order as running update_content.py, final_update.py and fix_navigation.py
+STAGES = [
+    ('global', stage_global),
+    ('metadata', stage_metadata),
+    ('cleanup', stage_cleanup),
+    ('navigation', stage_navigation),
+]
+
+def rebrand_content(content, file_path, timings=None, warnings=None):
+    """Run every stage over an in-memory document, appending anything left unrewritten to warnings"""
+    warnings = [] if warnings is None else warnings
+    for name, stage in STAGES:
+        started = time.perf_counter()
+        content = stage(content, file_path, warnings)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+    return content
+
+def rebrand_file(file_path):
+    """Rebrand a single HTML file with one read and at most one write
+
+    Returns (status, message, timings) so results can be gathered from worker
+    processes and reported in order.
+    """
+    timings = {}
+    warnings = []
+    try:
+        started = time.perf_counter()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        timings['read'] = time.perf_counter() - started
+
+        original_content = content
+        content = rebrand_content(content, file_path, timings, warnings)
+
+        if content != original_content:
+            started = time.perf_counter()
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            timings['write'] = time.perf_counter() - started
+            return UPDATED, with_warnings(f"Updated: {file_path}", file_path, warnings), timings
+        else:
+            return UNCHANGED, with_warnings(f"No changes needed: {file_path}", file_path, warnings), timings
+
+    except Exception as e:
+        return ERROR, f"Error updating {file_path}: {e}", timings
+
+def print_timings(timings):
+    """Print per-stage timings, summed over files (CPU time when run with --jobs)"""
+    print("\nStage timings:")
+    for name in ['read'] + [name for name, _ in STAGES] + ['write']:
+        print(f"  {name:<12}{timings.get(name, 0.0) * 1000:10.2f} ms")
+    print(f"  {'total':<12}{sum(timings.values()) * 1000:10.2f} ms")
+
+def rebrand_changed(paths):
+    """Rebrand pages reported by the watcher and return the ones written"""
+    written = []
+    for file_path in paths:
+        started = time.perf_counter()
+        status, message, _ = rebrand_file(file_path)
+        if status == UNCHANGED:
+            continue
+        print(f"{message} ({(time.perf_counter() - started) * 1000:.1f} ms)", flush=True)
+        if status == UPDATED:
+            written.append(file_path)
+    return written
+
+def watch_site(debounce=DEFAULT_DEBOUNCE, polling=False):
+    """Rebrand pages as they are saved until interrupted"""
+    print(f"Watching {BASE_DIR} for page edits (Ctrl+C to stop)...", flush=True)
+    try:
+        watch(BASE_DIR, rebrand_changed, debounce, polling)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    add_jobs_argument(parser)
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and rebrand each page as soon as it is saved')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE, metavar='SECONDS',
+                        help=f'with --watch, quiet period that ends a burst of saves (default: {DEFAULT_DEBOUNCE})')
+    args = parser.parse_args()
+
+    if args.watch:
+        watch_site(args.debounce, args.poll)
+        return
+
+    html_files = find_html_files()
+    print(f"Found {len(html_files)} HTML files to rebrand")
+
+    timings = {}
+    updated_count = 0
+    error_count = 0
+    for status, message, file_timings in map_files(rebrand_file, html_files, args.jobs):
+        print(message)
+        for name, seconds in file_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+        if status == UPDATED:
+            updated_count += 1
+        elif status == ERROR:
+            error_count += 1
+
+    print(f"\nCompleted! Updated {updated_count} files out of {len(html_files)} total files.")
+    if error_count:
+        print(f"{error_count} files could not be updated.")
+    print_timings(timings)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Index leftover source-market references without rewriting any page
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from file_jobs import add_jobs_argument, map_files
+from site_tree import find_html_files
+
+BASE_DIR = Path(__file__).parent
+INDEX_FILENAME = '.residual-index.json'
+
+# Source-market tokens, found together in one pass. Zip codes are indexed
+# under the code itself, every other token under its own text.
+RESIDUAL_TOKENS = [
+    r'Staten Island',
+    r'statenislandductless',
+    r'New York',
+    r'\bHarbor\b',
+    r'\bNY\b',
+    r'\b103\d\d\b',
+]
+RESIDUAL_PATTERN = re.compile('|'.join(f'(?:{token})' for token in RESIDUAL_TOKENS))
+
+# Characters of the matched line kept on each side of a hit
+CONTEXT_WIDTH = 40
+
+def file_signature(file_path):
+    """(mtime_ns, size) used to tell whether a file needs rescanning"""
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def scan_content(content):
+    """[token, line, column, context] for every residual token, in one pass"""
+    hits = []
+    line = 1
+    line_start = 0
+    pos = 0
+    for match in RESIDUAL_PATTERN.finditer(content):
+        start = match.start()
+        newlines = content.count('\n', pos, start)
+        if newlines:
+            line += newlines
+            line_start = content.rfind('\n', pos, start) + 1
+        pos = start
+        line_end = content.find('\n', start)
+        if line_end < 0:
+            line_end = len(content)
+        context = content[max(line_start, start - CONTEXT_WIDTH):min(line_end, match.end() + CONTEXT_WIDTH)]
+        hits.append([match.group(), line, start - line_start + 1, context.strip()])
+    return hits
+
+def scan_file(file_path):
+    """Scan one file and return (file_path, signature, hits, error); error is None unless it could not be read"""
+    try:
+        signature = file_signature(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return file_path, signature, scan_content(f.read()), None
+    except (OSError, UnicodeDecodeError) as e:
+        return file_path, None, None, f'{type(e).__name__}: {e}'
+
+class ResidualIndex:
+    """Persistent inverted index of residual tokens, refreshed file by file
+
+    Each file's hits are stored with its mtime and size; only files whose
+    signature changed are rescanned. The token -> locations map is derived
+    from the per-file hits and saved alongside them for direct querying.
+    Files that could not be read are kept in errors, not in the index, so
+    they are retried on every refresh.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, filename=INDEX_FILENAME):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / filename
+        self.files = {}
+        self.errors = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('pattern') == RESIDUAL_PATTERN.pattern:
+                self.files = data.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, file_path):
+        return Path(file_path).relative_to(self.base_dir).as_posix()
+
+    def stale_files(self, html_files):
+        """Files that are new or changed since they were last indexed"""
+        stale = []
+        for file_path in html_files:
+            entry = self.files.get(self._key(file_path))
+            try:
+                if entry is not None and entry['signature'] == file_signature(file_path):
+                    continue
+            except OSError:
+                pass
+            stale.append(file_path)
+        return stale
+
+    def refresh(self, jobs=1):
+        """Rescan new and changed files, drop deleted ones; returns the number rescanned"""
+        html_files = find_html_files(self.base_dir)
+        keep = {self._key(file_path) for file_path in html_files}
+        self.files = {key: entry for key, entry in self.files.items() if key in keep}
+
+        stale = self.stale_files(html_files)
+        self.errors = {}
+        for file_path, signature, hits, error in map_files(scan_file, stale, jobs):
+            key = self._key(file_path)
+            if error is not None:
+                self.files.pop(key, None)
+                self.errors[key] = error
+            else:
+                self.files[key] = {'signature': signature, 'hits': hits}
+        return len(stale)
+
+    def tokens(self):
+        """Inverted index: token -> [{file, line, column, context}], files in tree order"""
+        index = {}
+        for key in sorted(self.files):
+            for token, line, column, context in self.files[key]['hits']:
+                index.setdefault(token, []).append(
+                    {'file': key, 'line': line, 'column': column, 'context': context}
+                )
+        return dict(sorted(index.items()))
+
+    def save(self):
+        """Write the index atomically"""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'pattern': RESIDUAL_PATTERN.pattern,
+                'files': self.files,
+                'tokens': self.tokens(),
+            }, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+def print_summary(index):
+    """Print hit and file counts per token, then any files that could not be scanned"""
+    tokens = index.tokens()
+    if not tokens:
+        print("No residual source-market references found.")
+    else:
+        print(f"{'token':<24}{'hits':>7}{'files':>7}")
+        for token, hits in tokens.items():
+            print(f"{token:<24}{len(hits):>7}{len({hit['file'] for hit in hits}):>7}")
+    if index.errors:
+        print(f"\nCould not scan {len(index.errors)} files:")
+        for key, error in sorted(index.errors.items()):
+            print(f"  {key}: {error}")
+
+def print_hits(index, token):
+    """Print every location of one token"""
+    for hit in index.tokens().get(token, []):
+        print(f"{hit['file']}:{hit['line']}:{hit['column']}: {hit['context']}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--token', '-t', help='list every location of this token')
+    parser.add_argument('--rebuild', action='store_true', help=f'ignore {INDEX_FILENAME} and rescan every file')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 if any residual reference is found or a file cannot be scanned')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = ResidualIndex()
+    if args.rebuild:
+        index.files = {}
+    rescanned = index.refresh(args.jobs)
+    index.save()
+    elapsed = time.perf_counter() - started
+
+    if args.token:
+        print_hits(index, args.token)
+    else:
+        print_summary(index)
+        print(f"\nIndexed {len(index.files)} files ({rescanned} rescanned) in {elapsed * 1000:.1f} ms.")
+
+    if args.check and (index.errors or any(entry['hits'] for entry in index.files.values())):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
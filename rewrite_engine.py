@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Single-pass rewrite engine shared by the update scripts
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Rule kinds: 'literal' rules behave like str.replace, 'regex' rules like re.sub
+LITERAL = 'literal'
+REGEX = 'regex'
+
+# Streaming assumes no match is longer than this; unbounded regex rules
+# (e.g. [^<]*) are capped here, so longer matches can be missed when streaming
+MAX_MATCH_CAP = 64 * 1024
+
+# Default chunk size for streaming rewrites
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Files larger than this are streamed instead of read whole
+STREAM_THRESHOLD = 32 * 1024 * 1024
+
+# Group references in a re.sub replacement template
+GROUP_REFERENCE = re.compile(r'\\(?:\d|g<)')
+
+# Regex flags a rule may carry, with the inline letter that scopes each to the rule
+INLINE_FLAGS = [
+    (re.IGNORECASE, 'i'),
+    (re.MULTILINE, 'm'),
+    (re.DOTALL, 's'),
+    (re.VERBOSE, 'x'),
+    (re.ASCII, 'a'),
+    (re.UNICODE, 'u'),
+]
+SUPPORTED_FLAGS = sum(flag for flag, _ in INLINE_FLAGS)
+
+
+class Rule:
+    """One ordered rewrite rule"""
+
+    def __init__(self, kind, pattern, replacement, flags=0):
+        self.kind = kind
+        self.pattern = pattern
+        self.replacement = replacement
+        self.flags = int(flags)
+        if self.flags & ~SUPPORTED_FLAGS:
+            raise ValueError(f'unsupported regex flags for rule {pattern!r}: {flags!r}')
+        if kind == LITERAL:
+            self.regex = re.compile(re.escape(pattern))
+        else:
+            self.regex = re.compile(pattern, flags)
+
+    def source(self):
+        """Regex source for this rule, with its flags scoped to the rule"""
+        if self.kind == LITERAL:
+            return re.escape(self.pattern)
+        letters = ''.join(letter for flag, letter in INLINE_FLAGS if self.flags & flag)
+        if letters:
+            return f'(?{letters}:{self.pattern})'
+        return self.pattern
+
+    def apply(self, content):
+        """Apply this rule on its own, exactly like the original chain step"""
+        if self.kind == LITERAL:
+            return content.replace(self.pattern, self.replacement)
+        return self.regex.sub(self.replacement, content)
+
+    def max_length(self):
+        """Longest possible match, capped at MAX_MATCH_CAP"""
+        if self.kind == LITERAL:
+            return len(self.pattern)
+        width = sre_parse.parse(self.pattern, self.flags).getwidth()[1]
+        return min(width, MAX_MATCH_CAP)
+
+    def first_char(self):
+        """The character every match starts with, or None if it can vary"""
+        if self.kind == LITERAL:
+            return self.pattern[0]
+        if '|' in self.pattern or self.flags & (re.IGNORECASE | re.VERBOSE):
+            return None
+        head = self.pattern[:2]
+        if head[:1] == '\\' and len(head) == 2 and not head[1].isalnum():
+            return head[1]
+        if head[:1] and (head[0].isalnum() or head[0] in '<"\'@#%&=:;,/'):
+            if self.pattern[1:2] not in ('*', '?', '{'):
+                return head[0]
+        return None
+
+    def expand(self, match):
+        """Replacement text for a match of this rule's own regex"""
+        if self.kind == LITERAL:
+            return self.replacement
+        return match.expand(self.replacement)
+
+
+def build_rules(specs):
+    """Turn (kind, pattern, replacement[, flags]) tuples into Rule objects"""
+    return [spec if isinstance(spec, Rule) else Rule(*spec) for spec in specs]
+
+
+def apply_sequential(content, rules):
+    """Reference path: apply every rule in order over the whole string"""
+    for rule in rules:
+        content = rule.apply(content)
+    return content
+
+
+def literal_sources(text):
+    """Regex sources matching exactly text, both fully escaped and as a rule author writes them
+
+    re.escape() also escapes spaces and punctuation that a hand-written
+    pattern leaves bare, e.g. 'Staten\\ Island' for 'Staten Island'.
+    """
+    escaped = re.escape(text)
+    bare = re.sub(r'\\([ \'"\-#&~,:;<>=!@%/`])', r'\1', escaped)
+    return [form for form in {escaped, bare} if re.fullmatch(form, text)]
+
+
+def is_shadowed(rule, earlier_rules):
+    """Check whether an earlier literal rule always destroys this rule's matches
+
+    A later rule whose pattern requires text that an earlier literal rule has
+    already rewritten can never fire in the ordered chain, so it must not fire
+    in the single pass either.
+    """
+    for earlier in earlier_rules:
+        if earlier.kind != LITERAL or earlier.pattern in earlier.replacement:
+            continue
+        if rule.kind == LITERAL and earlier.pattern in rule.pattern:
+            return True
+        if rule.kind == REGEX and any(form in rule.pattern for form in literal_sources(earlier.pattern)):
+            return True
+    return False
+
+
+class RewriteEngine:
+    """Compile an ordered rule chain into one alternation matched in one scan"""
+
+    def __init__(self, rules):
+        self.rules = build_rules(rules)
+        self.active = []
+        for index, rule in enumerate(self.rules):
+            if not is_shadowed(rule, self.rules[:index]):
+                self.active.append(rule)
+
+        # Plain alternation: capturing groups around each rule would disable the
+        # first-character prefilter, so the matching rule is identified on hit
+        source = '|'.join(f'(?:{rule.source()})' for rule in self.active)
+        self.matcher = re.compile(source) if self.active else None
+        self.max_match = max((rule.max_length() for rule in self.active), default=0)
+
+        # Candidate rules per first character, kept in rule order
+        wildcard = [i for i, rule in enumerate(self.active) if rule.first_char() is None]
+        self._dispatch = {}
+        for index, rule in enumerate(self.active):
+            char = rule.first_char()
+            if char is not None:
+                self._dispatch.setdefault(char, []).append(index)
+        for char, indices in self._dispatch.items():
+            self._dispatch[char] = sorted(indices + wildcard)
+        self._wildcard = wildcard
+
+        # Later rules that can match inside an earlier rule's replacement get
+        # re-applied to that replacement, as the ordered chain would have done
+        self._cascade = []
+        for index, rule in enumerate(self.active):
+            later = self.active[index + 1:]
+            if rule.kind == REGEX and GROUP_REFERENCE.search(rule.replacement):
+                self._cascade.append(later)
+            else:
+                self._cascade.append(
+                    [other for other in later if other.regex.search(rule.replacement)]
+                )
+
+    def _replace(self, match):
+        # The alternation tries rules in order, so the first rule that matches
+        # at this position is the one the combined matcher took
+        string, start = match.string, match.start()
+        for index in self._dispatch.get(string[start], self._wildcard):
+            rule = self.active[index]
+            own = rule.regex.match(string, start)
+            if own:
+                break
+        else:
+            # The dispatch table left out the rule that matched; try them all in order
+            for index, rule in enumerate(self.active):
+                own = rule.regex.match(string, start)
+                if own:
+                    break
+            else:
+                raise RuntimeError(f'no rule re-matches {match.group()!r} at {start}')
+        text = rule.expand(own)
+        for later in self._cascade[index]:
+            text = later.apply(text)
+        return text
+
+    def rewrite(self, content):
+        """Rewrite content in a single scan"""
+        if self.matcher is None:
+            return content
+        return self.matcher.sub(self._replace, content)
+
+    def rewrite_stream(self, chunks):
+        """Rewrite an iterable of text chunks, yielding output with bounded memory
+
+        Text is only emitted once no match starting in it could still grow
+        into the next chunk, so at most max_match characters are carried over.
+        """
+        if self.matcher is None:
+            yield from chunks
+            return
+
+        carry = ''
+        for chunk in chunks:
+            buffer = carry + chunk
+            safe = len(buffer) - self.max_match
+            pos = 0
+            out = []
+            while pos < safe:
+                match = self.matcher.search(buffer, pos)
+                if match is None or match.start() >= safe:
+                    out.append(buffer[pos:safe])
+                    pos = safe
+                    break
+                out.append(buffer[pos:match.start()])
+                out.append(self._replace(match))
+                pos = match.end()
+            carry = buffer[pos:]
+            if out:
+                yield ''.join(out)
+        if carry:
+            yield self.rewrite(carry)
+
+
+def stream_sequential(chunks, rules):
+    """Streaming equivalent of apply_sequential: one streaming stage per rule"""
+    for rule in build_rules(rules):
+        chunks = RewriteEngine([rule]).rewrite_stream(chunks)
+    return chunks
+
+
+def read_chunks(f, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield text chunks from an open file"""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def rewrite_file_streaming(file_path, transform, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream a file through transform into a temp file and swap it in if changed
+
+    transform maps an iterable of text chunks to an iterable of text chunks.
+    Returns (changed, digest) where digest is the SHA-256 of the final content.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    source_digest = hashlib.sha256()
+    output_digest = hashlib.sha256()
+
+    def hashed_chunks(f):
+        for chunk in read_chunks(f, chunk_size):
+            source_digest.update(chunk.encode('utf-8'))
+            yield chunk
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.rewrite-', suffix='.tmp')
+    try:
+        with open(file_path, 'r', encoding='utf-8') as source, \
+                os.fdopen(fd, 'w', encoding='utf-8') as target:
+            for chunk in transform(hashed_chunks(source)):
+                output_digest.update(chunk.encode('utf-8'))
+                target.write(chunk)
+        changed = source_digest.digest() != output_digest.digest()
+        if changed:
+            shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)
+        else:
+            os.remove(temp_path)
+        return changed, output_digest.hexdigest()
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
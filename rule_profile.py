@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-rule profiling for the rewrite scripts
+"""
+
+import difflib
+import json
+import time
+
+from rewrite_engine import apply_sequential
+
+DEFAULT_REPORT = 'rule-profile.json'
+
+def add_profile_arguments(parser):
+    """Add the shared --profile and --top options to an argument parser"""
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_REPORT, metavar='REPORT',
+                        help=f'record time, matches and bytes changed per rule per file and write '
+                             f'a JSON report (default: {DEFAULT_REPORT}); runs serially')
+    parser.add_argument('--top', type=int, default=10, metavar='N',
+                        help='rules to list in the --profile summary (default: 10)')
+
+def edit_size(old, new):
+    """Bytes changed turning old into new: the longer side of what differs once the common ends are trimmed"""
+    old, new = old.encode('utf-8'), new.encode('utf-8')
+    if old == new:
+        return 0
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return max(len(old), len(new)) - prefix - suffix
+
+def changed_bytes(old, new):
+    """Bytes changed between two versions of a page, summed over the lines that differ"""
+    if old == new:
+        return 0
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return sum(edit_size(''.join(old_lines[i1:i2]), ''.join(new_lines[j1:j2]))
+               for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+
+class RuleProfiler:
+    """Collect wall time, match count and bytes changed per rule per file
+
+    Rules run one at a time through their own regex, so every match and
+    every microsecond is attributed to exactly one rule. Matches whose
+    replacement equals the matched text change nothing and are not counted.
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def _entry(self, group, name, kind):
+        key = (group, name)
+        if key not in self.stats:
+            self.stats[key] = {'group': group, 'rule': name, 'kind': kind, 'files': {}}
+        return self.stats[key]
+
+    def _record(self, group, name, kind, file_path, seconds, matches, bytes_changed):
+        files = self._entry(group, name, kind)['files']
+        stat = files.setdefault(str(file_path), {'seconds': 0.0, 'matches': 0, 'bytes_changed': 0})
+        stat['seconds'] += seconds
+        stat['matches'] += matches
+        stat['bytes_changed'] += bytes_changed
+
+    def apply_rule(self, group, rule, content, file_path):
+        """Apply one Rule, recording its cost and effect"""
+        matches = 0
+        bytes_changed = 0
+
+        def replace(match):
+            nonlocal matches, bytes_changed
+            text = rule.expand(match)
+            if text != match.group():
+                matches += 1
+                bytes_changed += edit_size(match.group(), text)
+            return text
+
+        started = time.perf_counter()
+        content = rule.regex.sub(replace, content)
+        self._record(group, rule.pattern, rule.kind, file_path,
+                     time.perf_counter() - started, matches, bytes_changed)
+        return content
+
+    def apply_rules(self, group, rules, content, file_path):
+        """Apply Rules in order, recording each one"""
+        for rule in rules:
+            content = self.apply_rule(group, rule, content, file_path)
+        return content
+
+    def call(self, group, name, func, content, file_path):
+        """Run a non-rule stage such as a block locator; a change counts as one match, sized by a line diff"""
+        started = time.perf_counter()
+        result = func(content)
+        seconds = time.perf_counter() - started
+        self._record(group, name, 'stage', file_path, seconds,
+                     int(result != content), changed_bytes(content, result))
+        return result
+
+    def totals(self):
+        """Per-rule totals, slowest first"""
+        rows = []
+        for entry in self.stats.values():
+            files = entry['files']
+            rows.append(dict(
+                entry,
+                seconds=sum(stat['seconds'] for stat in files.values()),
+                matches=sum(stat['matches'] for stat in files.values()),
+                bytes_changed=sum(stat['bytes_changed'] for stat in files.values()),
+                files_hit=sum(1 for stat in files.values() if stat['matches']),
+            ))
+        rows.sort(key=lambda row: row['seconds'], reverse=True)
+        return rows
+
+    def write_report(self, path):
+        """Write the JSON report"""
+        rows = self.totals()
+        report = {
+            'rules': rows,
+            'dead_rules': [{'group': row['group'], 'rule': row['rule']} for row in rows if not row['matches']],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+
+    def print_summary(self, top=10):
+        """Print the slowest rules and the rules that never matched"""
+        rows = self.totals()
+        print(f"\nTop {min(top, len(rows))} rules by time:")
+        print(f"  {'ms':>9} {'matches':>8} {'bytes':>9} {'files':>6}  rule")
+        for row in rows[:top]:
+            print(f"  {row['seconds'] * 1000:9.2f} {row['matches']:8d} {row['bytes_changed']:9d} "
+                  f"{row['files_hit']:6d}  {row['group']}: {row['rule'][:70]}")
+        dead = [row for row in rows if not row['matches']]
+        print(f"\n{len(dead)} of {len(rows)} rules never matched.")
+
+def apply_rules(rules, content, profiler=None, group='', file_path=''):
+    """Apply Rules in order, through the profiler when one is active"""
+    if profiler is None:
+        return apply_sequential(content, rules)
+    return profiler.apply_rules(group, rules, content, file_path)
+
+def finish_profile(profiler, args):
+    """Write the report and summary requested by --profile"""
+    if profiler is None:
+        return
+    profiler.write_report(args.profile)
+    profiler.print_summary(args.top)
+    print(f"Profile report written to {args.profile}")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Collect real-user performance beacons into an append-only log and report per-page and per-template percentiles
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from serve_site import encode_response, read_request
+from site_tree import page_kind
+
+DEFAULT_LOG = 'rum-beacons.jsonl'
+DEFAULT_PORT = 8001
+BEACON_PATH = '/beacon'
+REPORT_PATH = '/report'
+
+# Largest beacon body accepted; main.js sends at most a few dozen metrics per batch
+MAX_BODY_BYTES = 64 * 1024
+
+# Pages tracked individually; beacons for further pages only feed their template,
+# so junk paths cannot grow memory without bound
+MAX_PAGES = 10000
+
+# Metric names main.js sends, with the unit reported
+METRICS = {
+    'lcp': 'ms',
+    'cls': '',
+    'inp': 'ms',
+    'long_task': 'ms',
+    'scroll_handler': 'ms',
+    'scroll_long_task': 'ms',
+}
+QUANTILES = [('p50', 0.50), ('p75', 0.75), ('p99', 0.99)]
+
+CORS_HEADERS = [('Access-Control-Allow-Origin', '*'), ('Access-Control-Allow-Methods', 'POST'),
+                ('Access-Control-Allow-Headers', 'Content-Type')]
+
+class QuantileSketch:
+    """Streaming quantiles with bounded relative error in bounded memory
+
+    Values are counted in logarithmic buckets (as in DDSketch): every value
+    in a bucket is within relative_accuracy of the bucket's midpoint, so
+    any quantile is too. When more than max_buckets are in use the lowest
+    two are folded together, costing accuracy only in the fastest tail.
+    Sketches of the same accuracy merge exactly.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        """Count a non-negative value"""
+        self.count += count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 1e-9:
+            self.zeros += count
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def collapse(self):
+        """Fold the lowest bucket into the next one up"""
+        lowest = min(self.buckets)
+        count = self.buckets.pop(lowest)
+        following = min(self.buckets)
+        self.buckets[following] += count
+
+    def merge(self, other):
+        """Add every value counted by another sketch of the same accuracy"""
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def quantile(self, fraction):
+        """Estimated value at a fraction between 0 and 1, or None if empty"""
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """{'count': n, 'p50': value, ...}"""
+        summary = {'count': self.count}
+        for name, fraction in QUANTILES:
+            value = self.quantile(fraction)
+            summary[name] = round(value, 4) if value is not None else None
+        return summary
+
+def page_path(location):
+    """Site-relative page file for a beacon's location, e.g. '/locations/' -> 'locations/index.html'"""
+    path = unquote(urlsplit(location).path).lstrip('/')
+    if not path or path.endswith('/'):
+        path += 'index.html'
+    if '..' in Path(path).parts:
+        raise ValueError(f'invalid page: {location!r}')
+    return path
+
+def parse_beacon(body, received=None):
+    """Log record {'time', 'page', 'metrics'} for a beacon body; raises ValueError if it carries nothing usable"""
+    try:
+        data = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'invalid JSON: {e}') from e
+    if not isinstance(data, dict) or not isinstance(data.get('page'), str) or not isinstance(data.get('metrics'), list):
+        raise ValueError("expected {'page': path, 'metrics': [[name, value], ...]}")
+    metrics = []
+    for item in data['metrics']:
+        if not isinstance(item, list) or len(item) != 2 or item[0] not in METRICS:
+            continue
+        value = item[1]
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value >= 0:
+            metrics.append([item[0], value])
+    if not metrics:
+        raise ValueError('no known metrics in beacon')
+    return {'time': round(received if received is not None else time.time(), 3),
+            'page': page_path(data['page']), 'metrics': metrics}
+
+class Collector:
+    """Append-only beacon log plus per-page and per-template sketches of every metric
+
+    The log is the source of truth: sketches are rebuilt from it on start,
+    so they never need saving and the collector can be stopped at any time.
+    """
+
+    def __init__(self, log_path=DEFAULT_LOG, max_pages=MAX_PAGES):
+        self.log_path = Path(log_path)
+        self.max_pages = max_pages
+        self.pages = {}
+        self.templates = {}
+        self.beacons = 0
+        self.rejected = 0
+        self.untracked = 0
+        self.log = None
+
+    def ingest(self, record):
+        """Fold one log record into the sketches"""
+        page = record['page']
+        kind = page_kind(Path(page))
+        page_sketches = self.pages.get(page)
+        if page_sketches is None and len(self.pages) < self.max_pages:
+            page_sketches = self.pages[page] = {}
+        if page_sketches is None:
+            self.untracked += 1
+        template_sketches = self.templates.setdefault(kind, {})
+        for name, value in record['metrics']:
+            template_sketches.setdefault(name, QuantileSketch()).add(value)
+            if page_sketches is not None:
+                page_sketches.setdefault(name, QuantileSketch()).add(value)
+        self.beacons += 1
+
+    def replay(self):
+        """Rebuild the sketches from the log, skipping damaged lines; returns the records read"""
+        read = 0
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.ingest(record)
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by a crash, or written by hand
+                        continue
+                    read += 1
+        except FileNotFoundError:
+            pass
+        return read
+
+    def accept(self, body):
+        """Log and ingest one beacon body; returns whether it was usable"""
+        try:
+            record = parse_beacon(body)
+        except ValueError:
+            self.rejected += 1
+            return False
+        if self.log is None:
+            self.log = open(self.log_path, 'a+', encoding='utf-8')
+            # Start on a fresh line if the last write was cut short
+            if self.log.tell():
+                self.log.seek(self.log.tell() - 1)
+                if self.log.read(1) != '\n':
+                    self.log.write('\n')
+        self.log.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.log.flush()
+        self.ingest(record)
+        return True
+
+    def close(self):
+        """Close the log"""
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def report(self, pages=True):
+        """Percentiles of every metric per template and, optionally, per page"""
+        report = {
+            'beacons': self.beacons,
+            'rejected': self.rejected,
+            'untracked_pages': self.untracked,
+            'templates': {kind: {name: sketch.summary() for name, sketch in sorted(sketches.items())}
+                          for kind, sketches in sorted(self.templates.items())},
+        }
+        if pages:
+            report['pages'] = {page: {name: sketch.summary() for name, sketch in sorted(sketches.items())}
+                               for page, sketches in sorted(self.pages.items())}
+        return report
+
+    async def handle(self, reader, writer):
+        """Serve beacons and reports on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError:
+                    writer.write(encode_response(400, CORS_HEADERS, b'', close=True))
+                    break
+                if request is None:
+                    break
+                method, target, headers, close = request
+                path = urlsplit(target).path
+                body = b''
+                if method == 'POST':
+                    length = int(headers.get('content-length', '0') or 0)
+                    if length > MAX_BODY_BYTES:
+                        writer.write(encode_response(413, CORS_HEADERS, b'', close=True))
+                        break
+                    body = await reader.readexactly(length)
+
+                if method == 'POST' and path == BEACON_PATH:
+                    status = 204 if self.accept(body) else 400
+                    response, payload = CORS_HEADERS, b''
+                elif method == 'OPTIONS' and path == BEACON_PATH:
+                    status, response, payload = 204, CORS_HEADERS, b''
+                elif method == 'GET' and path == REPORT_PATH:
+                    status = 200
+                    response = [('Content-Type', 'application/json; charset=utf-8'), ('Cache-Control', 'no-store')]
+                    payload = json.dumps(self.report(), indent=2).encode('utf-8')
+                else:
+                    status, response, payload = 404, [('Content-Type', 'text/plain; charset=utf-8')], b'Not Found\n'
+                writer.write(encode_response(status, response, payload, close))
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def format_value(value, unit):
+    """A percentile for the summary table"""
+    if value is None:
+        return '-'
+    return f'{value:.1f} {unit}' if unit else f'{value:.3f}'
+
+def print_report(report, pages=False):
+    """Print p50/p75/p99 of every metric per template, and per page if asked"""
+    sections = [('template', report['templates'])]
+    if pages:
+        sections.append(('page', report.get('pages', {})))
+    for heading, groups in sections:
+        print(f"{heading:<40}{'metric':<18}{'count':>8}" + ''.join(f'{name:>12}' for name, _ in QUANTILES))
+        for group, metrics in groups.items():
+            for name, summary in metrics.items():
+                cells = ''.join(f'{format_value(summary[label], METRICS[name]):>12}' for label, _ in QUANTILES)
+                print(f"{group:<40}{name:<18}{summary['count']:>8,}{cells}")
+        print()
+    print(f"{report['beacons']:,} beacons ({report['rejected']} rejected, "
+          f"{report['untracked_pages']} beyond the {MAX_PAGES:,}-page limit)")
+
+async def serve(collector, host, port):
+    """Accept beacons until interrupted"""
+    server = await asyncio.start_server(collector.handle, host, port)
+    port = server.sockets[0].getsockname()[1]
+    print(f"Collecting beacons at http://{host}:{port}{BEACON_PATH} into {collector.log_path}; "
+          f"percentiles at http://{host}:{port}{REPORT_PATH} (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--log', type=Path, default=DEFAULT_LOG, help=f'append-only beacon log (default: {DEFAULT_LOG})')
+    parser.add_argument('--host', default='127.0.0.1', help='address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT,
+                        help=f'port to bind, 0 for any free port (default: {DEFAULT_PORT})')
+    parser.add_argument('--report', action='store_true', help='print percentiles from the log and exit instead of serving')
+    parser.add_argument('--pages', action='store_true', help='with --report, also list every page')
+    args = parser.parse_args()
+
+    collector = Collector(args.log)
+    started = time.perf_counter()
+    read = collector.replay()
+    if args.report:
+        print_report(collector.report(pages=args.pages), pages=args.pages)
+        return
+    print(f"Replayed {read:,} beacons from {args.log} in {(time.perf_counter() - started) * 1000:.1f} ms.")
+    try:
+        asyncio.run(serve(collector, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Build a prefix-sharded search index of the site's services and locations for js/main.js
+"""
+
+import argparse
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+from file_jobs import add_jobs_argument, map_files
+from json_ld import find_blocks, schema_nodes
+from site_data import LOCATIONS
+from site_tree import find_html_files, page_kind
+from sitemap import write_if_changed
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = BASE_DIR / 'build'
+INDEX_DIR = 'search'
+
+# Terms are sharded by their first PREFIX_LENGTH characters, numbers (zip codes) by one
+# more since they share few leading digits; js/main.js uses the same lengths
+PREFIX_LENGTH = 2
+NUMBER_PREFIX_LENGTH = 3
+
+# Terms on more pages than this are too common to narrow a search; shards list them
+# without postings so a lookup can ignore them instead of downloading every page
+MAX_POSTINGS = 200
+
+# Match weight by the field a term came from
+WEIGHTS = {'place': 3, 'title': 2, 'description': 1}
+
+STOPWORDS = {
+    'and', 'are', 'for', 'our', 'the', 'with', 'your', 'you', 'from', 'all', 'call', 'now', 'free',
+    'in', 'of', 'on', 'to', 'at', 'by', 'or', 'an', 'is', 'we', 'us',
+}
+
+TITLE_PATTERN = re.compile(r'<title>([^<]*)</title>')
+META_PATTERN = re.compile(r'<meta name="(description|keywords)" content="([^"]*)"')
+HEADING_PATTERN = re.compile(r'<h1[^>]*>(.*?)</h1>', re.DOTALL)
+HERO_PATTERN = re.compile(r'<section class="hero"[^>]*>(.*?)</section>', re.DOTALL)
+ZIP_PATTERN = re.compile(r'\b\d{5}\b')
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# js/main.js only adds the search box to pages whose script tag carries data-search
+SCRIPT_PATTERN = re.compile(r'<script src="[^"]*js/main(?:\.[0-9a-f]+)?\.js"(?![^>]*\bdata-search\b)')
+SEARCH_ATTRIBUTE = ' data-search'
+
+def normalize(text):
+    """Lower-case ASCII form of text, accents removed"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+def terms(text):
+    """Indexable words of text"""
+    return [word for word in re.findall(r'[a-z0-9]+', normalize(text))
+            if len(word) >= PREFIX_LENGTH and word not in STOPWORDS]
+
+def shard_key(term):
+    """Name of the shard holding term"""
+    return term[:NUMBER_PREFIX_LENGTH] if term[0].isdigit() else term[:PREFIX_LENGTH]
+
+def page_places(rel_path, content):
+    """Town names and zip codes a page is about"""
+    places = []
+    if page_kind(rel_path) == 'location' and rel_path.name in LOCATIONS:
+        info = LOCATIONS[rel_path.name]
+        places += [info['city'], info['zip']]
+    for start, end in find_blocks(content):
+        try:
+            data = json.loads(content[start:end])
+        except ValueError:
+            continue
+        for node in schema_nodes(data):
+            if isinstance(node.get('serviceArea'), str):
+                places.append(node['serviceArea'].split(',')[0])
+    hero = HERO_PATTERN.search(content)
+    if hero:
+        places += ZIP_PATTERN.findall(TAG_PATTERN.sub(' ', hero.group(1)))
+    return places
+
+def extract_page(item):
+    """(url, label, {term: weight}) for one page; item is (file_path, root)
+
+    The label shown in results is the page heading, since location pages
+    share one <title>.
+    """
+    file_path, root = item
+    rel_path = Path(file_path).relative_to(root)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    title = TITLE_PATTERN.search(content)
+    title = title.group(1).strip() if title else rel_path.stem.replace('-', ' ').title()
+    heading = HEADING_PATTERN.search(content)
+    label = ' '.join(TAG_PATTERN.sub('', heading.group(1)).split()) if heading else title
+    metadata = dict(META_PATTERN.findall(content))
+
+    weights = {}
+    fields = [('description', metadata.get('description', '')), ('title', f'{title} {label}'),
+              ('place', ' '.join(page_places(rel_path, content)))]
+    for field, text in fields:
+        for term in terms(text):
+            weights[term] = max(weights.get(term, 0), WEIGHTS[field])
+    url = '' if rel_path.as_posix() == 'index.html' else rel_path.as_posix()
+    return url, label, weights
+
+def build_shards(pages, max_postings=MAX_POSTINGS):
+    """{prefix: shard} where a shard maps its terms to [[doc id, weight]] and carries those docs
+
+    Each shard holds every document its terms point at, so a lookup
+    fetches exactly one file per query word. Terms on more than max_postings
+    pages go in 'common' without postings.
+    """
+    postings = {}
+    for doc_id, (_, _, weights) in enumerate(pages):
+        for term, weight in weights.items():
+            postings.setdefault(term, []).append([doc_id, weight])
+    shards = {}
+    for term, entries in sorted(postings.items()):
+        shard = shards.setdefault(shard_key(term), {'terms': {}, 'common': [], 'docs': {}})
+        if len(entries) > max_postings:
+            shard['common'].append(term)
+            continue
+        shard['terms'][term] = entries
+        for doc_id, _ in entries:
+            shard['docs'][str(doc_id)] = pages[doc_id][:2]
+    # The lookup needs the stopwords to skip them; each shard carries only those with its prefix
+    for shard_name, shard in shards.items():
+        shard['stopwords'] = sorted(word for word in STOPWORDS if shard_key(word) == shard_name)
+    return shards
+
+def write_index(output_dir, shards):
+    """Write one JSON file per shard and remove shards that no longer exist; returns (written, total bytes)"""
+    index_dir = Path(output_dir) / INDEX_DIR
+    index_dir.mkdir(parents=True, exist_ok=True)
+    written = total = 0
+    for prefix, shard in shards.items():
+        data = json.dumps(shard, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        total += len(data)
+        if write_if_changed(index_dir / f'{prefix}.json', data):
+            written += 1
+    for stale in index_dir.glob('*.json'):
+        if stale.stem not in shards:
+            stale.unlink()
+    return written, total
+
+def enable_search(file_path):
+    """Add data-search to a page's main.js script tag; returns whether the page changed"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    new_content = SCRIPT_PATTERN.sub(lambda match: match.group(0) + SEARCH_ATTRIBUTE, content, count=1)
+    if new_content == content:
+        return False
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(new_content)
+    return True
+
+def build_search_index(root=DEFAULT_OUTPUT_DIR, jobs=1):
+    """Index every page under root into root/search/ and enable the search box on them
+
+    Returns (pages, shards, written, total bytes, largest).
+    """
+    root = Path(root)
+    items = [(file_path, root) for file_path in find_html_files(root)]
+    pages = list(map_files(extract_page, items, jobs))
+    shards = build_shards(pages)
+    written, total = write_index(root, shards)
+    for file_path, _ in items:
+        enable_search(file_path)
+    largest = max((len(json.dumps(shard, separators=(',', ':'))) for shard in shards.values()), default=0)
+    return len(pages), len(shards), written, total, largest
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', '-o', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'built site to index; shards go in its {INDEX_DIR}/ (default: {DEFAULT_OUTPUT_DIR.name}/)')
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    pages, shards, written, total, largest = build_search_index(args.output, args.jobs)
+    print(f"Indexed {pages} pages into {shards} shards ({written} written), "
+          f"{total / 1024:.1f} KB total, largest {largest / 1024:.1f} KB.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Serve a built site locally with an in-memory cache, ETags and precompressed bodies, and load-test it
+"""
+
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from asset_pipeline import HEADERS_FILENAME
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_ROOT = BASE_DIR / 'build'
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_MB = 64
+
+# Load-test pages, relative to the served root
+DEFAULT_PAGES = ['index.html', 'locations/*.html']
+
+# Content-Encoding by sibling suffix, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+REASONS = {
+    200: 'OK', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Content Too Large',
+}
+
+def content_type(path):
+    """MIME type of a file, with a charset for text"""
+    mime = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mime.startswith('text/') or mime in ('application/javascript', 'application/json', 'image/svg+xml'):
+        mime += '; charset=utf-8'
+    return mime
+
+def accepted_encodings(header):
+    """Content codings a client accepts, from its Accept-Encoding header"""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header matches a strong ETag"""
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+def read_headers_file(root):
+    """Extra response headers by path from a Netlify-style _headers file; a trailing * matches a prefix"""
+    rules = []
+    try:
+        with open(Path(root) / HEADERS_FILENAME, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if not line[0].isspace():
+            rules.append((line.strip(), []))
+        elif rules and ':' in line:
+            name, _, value = line.strip().partition(':')
+            rules[-1][1].append((name.strip(), value.strip()))
+    return rules
+
+class FileCache:
+    """LRU cache of file bodies bounded by total size
+
+    Entries are keyed by path and validated against the file's mtime and
+    size on every lookup, so a rebuilt file is never served stale. Files
+    bigger than an eighth of the budget are read but not kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, stat):
+        """(body, etag) for a file, from memory when its stat still matches"""
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == signature:
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[1], entry[2]
+
+        self.misses += 1
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.discard(path)
+        if len(body) <= self.max_bytes // 8:
+            self.entries[path] = (signature, body, etag)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return body, etag
+
+    def discard(self, path):
+        """Forget a cached file"""
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+class StaticSite:
+    """Request handling for one output tree"""
+
+    def __init__(self, root, cache_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.root = Path(root).resolve()
+        self.cache = FileCache(cache_bytes)
+        self.header_rules = read_headers_file(self.root)
+
+    def resolve(self, target):
+        """File for a request target, or None if it is missing, outside the root or hidden
+
+        Dot-named files and directories hold build caches (.compress-cache.json,
+        .image-cache/ ...) and are never served.
+        """
+        path = unquote(urlsplit(target).path)
+        relative = path.lstrip('/')
+        if not relative or relative.endswith('/'):
+            relative += 'index.html'
+        if any(part.startswith('.') for part in relative.split('/')):
+            return None
+        candidate = (self.root / relative).resolve()
+        if candidate != self.root and self.root not in candidate.parents:
+            return None
+        if any(part.startswith('.') for part in candidate.relative_to(self.root).parts):
+            return None
+        if candidate.is_dir():
+            candidate = candidate / 'index.html'
+        return candidate if candidate.is_file() else None
+
+    def extra_headers(self, url_path):
+        """Headers from _headers that apply to a URL path"""
+        headers = []
+        for pattern, values in self.header_rules:
+            if pattern == url_path or (pattern.endswith('*') and url_path.startswith(pattern[:-1])):
+                headers += values
+        return headers
+
+    def representation(self, path, accepted):
+        """(body, etag, content coding or None, stat) of the best representation a client accepts"""
+        stat = os.stat(path)
+        for coding, suffix in ENCODINGS:
+            if coding not in accepted:
+                continue
+            sibling = str(path) + suffix
+            try:
+                sibling_stat = os.stat(sibling)
+            except OSError:
+                continue
+            # A sibling older than its source is stale and ignored
+            if sibling_stat.st_mtime_ns >= stat.st_mtime_ns:
+                body, etag = self.cache.get(sibling, sibling_stat)
+                return body, etag, coding, stat
+        body, etag = self.cache.get(str(path), stat)
+        return body, etag, None, stat
+
+    def respond(self, method, target, headers):
+        """(status, [(header, value)], body) for one request"""
+        if method not in ('GET', 'HEAD'):
+            return 405, [('Allow', 'GET, HEAD')], b''
+        path = self.resolve(target)
+        if path is None:
+            return 404, [('Content-Type', 'text/plain; charset=utf-8')], b'Not Found\n'
+
+        body, etag, coding, stat = self.representation(path, accepted_encodings(headers.get('accept-encoding', '')))
+        url_path = '/' + path.relative_to(self.root).as_posix()
+        response = [
+            ('Content-Type', content_type(path.name)),
+            ('ETag', etag),
+            ('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True)),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        response += self.extra_headers(url_path) or [('Cache-Control', 'no-cache')]
+        if coding:
+            response.append(('Content-Encoding', coding))
+        if etag_matches(headers.get('if-none-match', ''), etag):
+            return 304, response, b''
+        return 200, response, body
+
+    async def handle(self, reader, writer):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError:
+                    writer.write(encode_response(400, [], b'', close=True))
+                    break
+                if request is None:
+                    break
+                method, target, headers, close = request
+                status, response, body = self.respond(method, target, headers)
+                writer.write(encode_response(status, response, body, close, include_body=method != 'HEAD'))
+                await writer.drain()
+                if close:
+                    break
+        finally:
+            writer.close()
+
+async def read_request(reader):
+    """(method, target, {header: value}, close) of the next request head, or None once the client is gone
+
+    Header names are lower-cased; a malformed request line raises ValueError.
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split()
+    if len(parts) != 3:
+        raise ValueError(f'malformed request line: {lines[0]!r}')
+    method, target, version = parts
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    connection = headers.get('connection', '').lower()
+    close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+    return method, target, headers, close
+
+def encode_response(status, headers, body, close=False, include_body=True):
+    """HTTP/1.1 response bytes"""
+    lines = [f'HTTP/1.1 {status} {REASONS[status]}']
+    lines += [f'{name}: {value}' for name, value in headers]
+    if status not in (204, 304):
+        lines.append(f'Content-Length: {len(body)}')
+    lines.append('Connection: close' if close else 'Connection: keep-alive')
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    return head + body if include_body and status not in (204, 304) else head
+
+async def start_server(root, host, port, cache_bytes):
+    """Start serving root; returns (server, site)"""
+    site = StaticSite(root, cache_bytes)
+    server = await asyncio.start_server(site.handle, host, port)
+    return server, site
+
+# --- Load generator ---------------------------------------------------------
+
+def load_test_paths(root, patterns):
+    """URL paths of the pages matching glob patterns under root"""
+    root = Path(root)
+    paths = []
+    for pattern in patterns:
+        paths += sorted('/' + path.relative_to(root).as_posix() for path in root.glob(pattern) if path.is_file())
+    return paths
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))]
+
+async def client(host, port, paths, offset, deadline, encoding, revalidate, results):
+    """One keep-alive connection issuing requests back to back until the deadline"""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        index = offset
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: {encoding}\r\n'
+            if revalidate and path in etags:
+                request += f'If-None-Match: {etags[path]}\r\n'
+            started = time.perf_counter()
+            writer.write((request + '\r\n').encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            status = int(lines[0].split()[1])
+            length = 0
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                name = name.strip().lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'etag':
+                    etags[path] = value.strip()
+            if length:
+                await reader.readexactly(length)
+            results.append((time.perf_counter() - started, status, length))
+    finally:
+        writer.close()
+
+async def load_test(host, port, paths, connections, duration, encoding='br, gzip', revalidate=False):
+    """Drive the server from several connections; returns a summary dict"""
+    results = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        client(host, port, paths, number, deadline, encoding, revalidate, results)
+        for number in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(result[0] for result in results)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'requests': len(results),
+        'seconds': elapsed,
+        'requests_per_second': len(results) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'bytes': sum(result[2] for result in results),
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+def print_load_result(result, site):
+    """Print a load-test summary"""
+    statuses = ', '.join(f'{status}: {count}' for status, count in result['statuses'].items())
+    print(f"{result['requests']} requests in {result['seconds']:.2f} s: "
+          f"{result['requests_per_second']:.0f} req/s, p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+    print(f"  {result['bytes'] / 1024 / 1024:.1f} MB of bodies; statuses {statuses}")
+    if site is not None:
+        print(f"  cache: {site.cache.hits} hits, {site.cache.misses} misses, "
+              f"{len(site.cache.entries)} files / {site.cache.size / 1024:.0f} KB held")
+
+async def run(args):
+    """Serve, or serve and load-test, as the arguments ask"""
+    host, port = args.host, args.port
+    site = None
+    if args.target:
+        host, _, port = args.target.partition(':')
+        port = int(port or 80)
+    else:
+        server, site = await start_server(args.root, host, port, args.cache_mb * 1024 * 1024)
+        port = server.sockets[0].getsockname()[1]
+
+    if not args.load_test:
+        print(f"Serving {site.root} at http://{host}:{port}/ (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+        return
+
+    paths = load_test_paths(args.root, args.pages)
+    if not paths:
+        raise SystemExit(f"No pages match {args.pages} under {args.root}")
+    encoding = 'identity' if args.identity else 'br, gzip'
+    print(f"Load-testing {len(paths)} pages with {args.connections} connections for {args.duration:g} s...")
+    result = await load_test(host, port, paths, args.connections, args.duration, encoding, args.revalidate)
+    print_load_result(result, site)
+    if site is not None:
+        server.close()
+        await server.wait_closed()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--root', type=Path, default=DEFAULT_ROOT,
+                        help=f'output tree to serve (default: {DEFAULT_ROOT.name}/)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT,
+                        help=f'port to bind, 0 for any free port (default: {DEFAULT_PORT})')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB, metavar='MB',
+                        help=f'memory budget of the file cache (default: {DEFAULT_CACHE_MB})')
+    load = parser.add_argument_group('load test')
+    load.add_argument('--load-test', action='store_true',
+                      help='start the server, drive it with the load generator and report, then exit')
+    load.add_argument('--target', metavar='HOST:PORT', help='load-test an already running server instead')
+    load.add_argument('--pages', nargs='+', default=DEFAULT_PAGES, metavar='GLOB',
+                      help=f'pages to request, relative to the root (default: {" ".join(DEFAULT_PAGES)})')
+    load.add_argument('--connections', '-c', type=int, default=32, help='concurrent connections (default: 32)')
+    load.add_argument('--duration', '-d', type=float, default=5.0, help='seconds to run (default: 5)')
+    load.add_argument('--identity', action='store_true', help='request uncompressed bodies')
+    load.add_argument('--revalidate', action='store_true',
+                      help='send If-None-Match with the last ETag seen, measuring 304 responses')
+    args = parser.parse_args()
+    if args.target:
+        args.load_test = True
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Business, service and location data shared by the update scripts and the site builder
+"""
+
+# Business profile used in headers, footers and schema markup
+BUSINESS = {
+    'name': 'Belpre OH Ductless Mini Splits',
+    'brand': 'Belpre Ductless Pro',
+    'phone': '+1-888-918-9104',
+    'phone_link': '+18889189104',
+    'phone_display': '(888) 918-9104',
+    'street': '123 Main St',
+    'city': 'Belpre',
+    'state': 'OH',
+    'state_name': 'Ohio',
+    'zip': '45714',
+    'latitude': 39.2742,
+    'longitude': -81.5734,
+    'domain': 'belpreductless.com',
+    'email': 'info@belpreductless.com',
+    'facebook': 'https://www.facebook.com/belpreductless',
+    'instagram': 'https://www.instagram.com/belpreductless',
+}
+
+# Service pages in navigation order
+SERVICES = {
+    'ductless-mini-split-installation.html': {
+        'label': 'Ductless Mini Split Installation',
+        'title': 'Ductless Mini Split Installation Belpre OH | Professional HVAC Installation',
+        'description': 'Expert ductless mini split installation in Belpre, Ohio. Energy-efficient systems, professional technicians, same-day installation. Free estimates.',
+        'keywords': 'ductless mini split installation Belpre OH, HVAC installation, mini split systems, energy efficient cooling heating'
+    },
+    'hvac-repair.html': {
+        'label': 'HVAC Repair',
+        'title': 'HVAC Repair Services Belpre OH | 24/7 Emergency Heating & Cooling Repair',
+        'description': 'Expert HVAC repair services in Belpre, Ohio. 24/7 emergency heating and cooling repair. Licensed technicians. Same-day service.',
+        'keywords': 'HVAC repair Belpre OH, heating repair, air conditioning repair, furnace repair, emergency HVAC'
+    },
+    'air-conditioning-installation.html': {
+        'label': 'AC Installation',
+        'title': 'Air Conditioning Installation Belpre OH | AC Installation Services',
+        'description': 'Professional air conditioning installation in Belpre, Ohio. Energy-efficient AC systems, expert installation, free estimates.',
+        'keywords': 'air conditioning installation Belpre OH, AC installation, cooling systems, central air'
+    },
+    'heating-installation.html': {
+        'label': 'Heating Installation',
+        'title': 'Heating Installation Belpre OH | Furnace & Heat Pump Installation',
+        'description': 'Professional heating system installation in Belpre, Ohio. Furnaces, heat pumps, boilers. Expert installation, energy-efficient systems.',
+        'keywords': 'heating installation Belpre OH, furnace installation, heat pump installation, boiler installation'
+    },
+    'ductwork-services.html': {
+        'label': 'Ductwork Services',
+        'title': 'Ductwork Services Belpre OH | Duct Installation, Cleaning & Repair',
+        'description': 'Professional ductwork services in Belpre, Ohio. Duct installation, cleaning, repair, and replacement.',
+        'keywords': 'ductwork services Belpre OH, duct installation, duct cleaning, duct repair'
+    },
+    'commercial-hvac.html': {
+        'label': 'Commercial HVAC',
+        'title': 'Commercial HVAC Services Belpre OH | Business Heating & Cooling',
+        'description': 'Commercial HVAC services in Belpre, Ohio. Business heating and cooling installation, repair, maintenance.',
+        'keywords': 'commercial HVAC Belpre OH, business HVAC, commercial heating cooling'
+    },
+    'emergency-hvac.html': {
+        'label': 'Emergency HVAC',
+        'title': '24/7 Emergency HVAC Services Belpre OH | Emergency Heating & Cooling Repair',
+        'description': '24/7 emergency HVAC services in Belpre, Ohio. Emergency heating and cooling repair, same-day service, licensed technicians.',
+        'keywords': 'emergency HVAC Belpre OH, 24/7 HVAC repair, emergency heating, emergency cooling'
+    },
+    'hvac-maintenance.html': {
+        'label': 'HVAC Maintenance',
+        'title': 'HVAC Maintenance Services Belpre OH | Heating & Cooling Maintenance',
+        'description': 'Professional HVAC maintenance services in Belpre, Ohio. Preventive maintenance, tune-ups, service contracts.',
+        'keywords': 'HVAC maintenance Belpre OH, heating maintenance, cooling maintenance, HVAC tune-up'
+    },
+    'indoor-air-quality.html': {
+        'label': 'Indoor Air Quality',
+        'title': 'Indoor Air Quality Services Belpre OH | Air Purification & Filtration',
+        'description': 'Indoor air quality services in Belpre, Ohio. Air purification, filtration systems, humidity control.',
+        'keywords': 'indoor air quality Belpre OH, air purification, air filtration, humidity control'
+    },
+    'heat-pump-services.html': {
+        'label': 'Heat Pump Services',
+        'title': 'Heat Pump Services Belpre OH | Heat Pump Installation & Repair',
+        'description': 'Heat pump services in Belpre, Ohio. Installation, repair, maintenance of heat pump systems.',
+        'keywords': 'heat pump services Belpre OH, heat pump installation, heat pump repair'
+    }
+}
+
+# Location pages mapped onto the towns they serve. Pages with a title and
+# description are featured in the navigation menu, in this order.
+LOCATIONS = {
+    'st-george.html': {
+        'city': 'Belpre',
+        'zip': '45714',
+        'title': 'Belpre Ohio Ductless Mini Split Installation & HVAC Services',
+        'description': 'Expert ductless mini split installation, HVAC repair, and air conditioning services in Belpre, Ohio. 24/7 emergency service.'
+    },
+    'stapleton.html': {
+        'city': 'Marietta',
+        'zip': '45750',
+        'title': 'Marietta Ohio Ductless Mini Split Installation & HVAC Services',
+        'description': 'Expert ductless mini split installation, HVAC repair, and air conditioning services in Marietta, Ohio. 24/7 emergency service.'
+    },
+    'port-richmond.html': {
+        'city': 'Little Hocking',
+        'zip': '45742',
+        'title': 'Little Hocking Ohio HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Little Hocking, Ohio. Ductless mini split installation, heating and cooling repair.'
+    },
+    'tottenville.html': {
+        'city': 'Vincent',
+        'zip': '45784',
+        'title': 'Vincent Ohio HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Vincent, Ohio. Ductless mini split installation, heating and cooling repair.'
+    },
+    'great-kills.html': {
+        'city': 'Barlow',
+        'zip': '45712',
+        'title': 'Barlow Ohio HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Barlow, Ohio. Ductless mini split installation, heating and cooling repair.'
+    },
+    'new-dorp.html': {
+        'city': 'Parkersburg, WV',
+        'zip': '26101',
+        'title': 'Parkersburg WV HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Parkersburg, West Virginia. Ductless mini split installation, heating and cooling repair.'
+    },
+    'west-brighton.html': {
+        'city': 'Beverly',
+        'zip': '45715',
+        'title': 'Beverly Ohio HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Beverly, Ohio. Ductless mini split installation, heating and cooling repair.'
+    },
+    'castleton-corners.html': {
+        'city': 'Williamstown, WV',
+        'zip': '26187',
+        'title': 'Williamstown WV HVAC Services | Ductless Mini Split Installation',
+        'description': 'Expert HVAC services in Williamstown, West Virginia. Ductless mini split installation, heating and cooling repair.'
+    },
+    'new-brighton.html': {'city': 'Parkersburg, WV', 'zip': '26101'},
+    'south-beach.html': {'city': 'Williamstown, WV', 'zip': '26187'},
+    'willowbrook.html': {'city': 'Athens', 'zip': '45701'},
+    'clifton.html': {'city': 'Vincent', 'zip': '45784'},
+    'charleston.html': {'city': 'Charleston, WV', 'zip': '25301'},
+    'dongan-hills.html': {'city': 'Beverly', 'zip': '45715'},
+    'eltingville.html': {'city': 'Little Hocking', 'zip': '45742'},
+    'grant-city.html': {'city': 'Barlow', 'zip': '45712'},
+    'mariners-harbor.html': {'city': 'Marietta', 'zip': '45750'},
+    'oakwood.html': {'city': 'Athens', 'zip': '45701'},
+    'pleasant-plains.html': {'city': 'Beverly', 'zip': '45715'},
+    'richmond-valley.html': {'city': 'Vincent', 'zip': '45784'},
+    'bay-terrace.html': {'city': 'Parkersburg, WV', 'zip': '26101'}
+}
+
+def featured_locations(locations=None):
+    """Locations shown in the navigation menu, in menu order"""
+    if locations is None:
+        locations = LOCATIONS
+    return {filename: info for filename, info in locations.items() if 'title' in info}
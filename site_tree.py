@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Locate the site's HTML pages
+"""
+
+import os
+
+# Directories that hold partials or generated output rather than site pages
+EXCLUDED_DIRS = {'templates', 'build', 'dist', '__pycache__'}
+
+def page_kind(rel_path):
+    """Classify a page, by its path relative to the site root, as 'index', 'service', 'location' or 'page'
+
+    This is the page template: build_site.py renders with it and the
+    asset, budget, search and metrics stages group pages by it.
+    """
+    if rel_path.parts[0] == 'services':
+        return 'service'
+    if rel_path.parts[0] == 'locations':
+        return 'location'
+    if rel_path.as_posix() == 'index.html':
+        return 'index'
+    return 'page'
+
+def find_html_files(base_dir):
+    """Find all HTML pages under base_dir, sorted, skipping partials and build output"""
+    html_files = []
+    
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS and not d.startswith('.')]
+        for file in files:
+            if file.endswith('.html'):
+                html_files.append(os.path.join(root, file))
+    
+    return sorted(html_files)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Generate sitemap.xml from the page tree, moving lastmod only when a page's content changes
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from site_tree import find_html_files, page_kind
+
+BASE_DIR = Path(__file__).parent
+SITE_URL = 'https://belpreohductlessminisplits.netlify.app'
+STATE_FILENAME = '.sitemap-cache.json'
+
+# The sitemap protocol allows at most 50,000 URLs per file
+MAX_URLS = 50000
+
+# Section order, comment, changefreq and priority by page kind
+SECTIONS = [
+    ('index', None, 'weekly', '1.0'),
+    ('service', 'Service Pages', 'monthly', '0.8'),
+    ('location', 'Location Pages', 'monthly', '0.7'),
+    ('page', 'Other Pages', 'monthly', '0.5'),
+]
+
+URL_PATTERN = re.compile(
+    r'<url>\s*<loc>([^<]*)</loc>(?:\s*<lastmod>([^<]*)</lastmod>)?'
+    r'(?:\s*<changefreq>([^<]*)</changefreq>)?(?:\s*<priority>([^<]*)</priority>)?'
+)
+
+def page_url(base_url, rel_path):
+    """Public URL of a page; the home page is the site root"""
+    path = rel_path.as_posix()
+    return f'{base_url}/' if path == 'index.html' else f'{base_url}/{path}'
+
+def read_overrides(path):
+    """(lastmod, changefreq, priority) per URL from an existing sitemap and its gzipped parts
+
+    Read once into the state: changefreq and priority keep hand-tuned values,
+    and lastmod seeds pages the state has no record of yet (a fresh clone or
+    CI, since the state file is not committed).
+    """
+    path = Path(path)
+    contents = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            contents.append(f.read())
+    except OSError:
+        return {}
+    for part in sorted(path.parent.glob('sitemap-*.xml.gz')):
+        try:
+            contents.append(gzip.decompress(part.read_bytes()).decode('utf-8'))
+        except (OSError, EOFError, UnicodeDecodeError):
+            continue
+    return {loc: (lastmod, changefreq, priority)
+            for content in contents for loc, lastmod, changefreq, priority in URL_PATTERN.findall(content)}
+
+class SitemapState:
+    """JSON record of each page's stat, content hash, lastmod, changefreq and priority
+
+    A page whose mtime and size match is not read again; one whose content
+    hash is unchanged keeps its lastmod even if it was rewritten.
+    """
+
+    def __init__(self, root, filename=STATE_FILENAME):
+        self.path = Path(root) / filename
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def page(self, file_path, key, today, seed_lastmod=None):
+        """A page's entry, with lastmod moved to today when its content hash changed
+
+        A page with no entry yet takes seed_lastmod, its date in the existing
+        sitemap, when there is one: without a recorded hash there is no sign
+        it changed since.
+        """
+        stat = os.stat(file_path)
+        entry = self.entries.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry
+
+        with open(file_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if entry is None:
+            entry = self.entries[key] = {}
+            if seed_lastmod:
+                entry.update(lastmod=seed_lastmod, sha256=digest)
+        if entry.get('sha256') != digest:
+            entry['lastmod'] = today
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=digest)
+        return entry
+
+    def prune(self, keys):
+        """Drop entries for pages that no longer exist"""
+        self.entries = {key: entry for key, entry in self.entries.items() if key in keys}
+
+    def save(self):
+        """Write the state atomically"""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+def collect_urls(root, base_url, state, overrides, today):
+    """(kind, loc, lastmod, changefreq, priority) for every page, in section order"""
+    defaults = {kind: (changefreq, priority) for kind, _, changefreq, priority in SECTIONS}
+    order = {kind: index for index, (kind, _, _, _) in enumerate(SECTIONS)}
+    urls = []
+    keys = set()
+    for file_path in find_html_files(root):
+        rel_path = Path(file_path).relative_to(root)
+        key = rel_path.as_posix()
+        keys.add(key)
+        kind = page_kind(rel_path)
+        loc = page_url(base_url, rel_path)
+        lastmod, changefreq, priority = overrides.get(loc, (None, None, None))
+        entry = state.page(file_path, key, today, lastmod)
+        if 'priority' not in entry:
+            entry['changefreq'] = changefreq or defaults[kind][0]
+            entry['priority'] = priority or defaults[kind][1]
+        urls.append((kind, loc, entry['lastmod'], entry['changefreq'], entry['priority']))
+    state.prune(keys)
+    urls.sort(key=lambda url: order[url[0]])
+    return urls
+
+def render_urlset(urls):
+    """urlset XML in the layout of the hand-written sitemap"""
+    comments = {kind: comment for kind, comment, _, _ in SECTIONS}
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    section = None
+    for kind, loc, lastmod, changefreq, priority in urls:
+        if kind != section:
+            section = kind
+            if comments[kind] and len(lines) > 2:
+                lines.append('  ')
+            if comments[kind]:
+                lines.append(f'  <!-- {comments[kind]} -->')
+        lines += [
+            '  <url>',
+            f'    <loc>{escape(loc)}</loc>',
+            f'    <lastmod>{lastmod}</lastmod>',
+            f'    <changefreq>{changefreq}</changefreq>',
+            f'    <priority>{priority}</priority>',
+            '  </url>',
+        ]
+    lines.append('</urlset>')
+    return '\n'.join(lines) + '\n'
+
+def render_index(parts):
+    """sitemapindex XML for (loc, lastmod) parts"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for loc, lastmod in parts:
+        lines += [
+            '  <sitemap>',
+            f'    <loc>{escape(loc)}</loc>',
+            f'    <lastmod>{lastmod}</lastmod>',
+            '  </sitemap>',
+        ]
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines) + '\n'
+
+def write_if_changed(path, data):
+    """Write bytes unless the file already holds exactly that; True if written"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def write_sitemaps(root, base_url, urls, max_urls=MAX_URLS):
+    """Write sitemap.xml, or an index of gzipped parts when there are more than max_urls
+
+    Returns the names of the files written.
+    """
+    root = Path(root)
+    files = {}
+    if len(urls) <= max_urls:
+        files['sitemap.xml'] = render_urlset(urls).encode('utf-8')
+    else:
+        parts = []
+        for number, start in enumerate(range(0, len(urls), max_urls), 1):
+            chunk = urls[start:start + max_urls]
+            name = f'sitemap-{number}.xml.gz'
+            # mtime=0 keeps a part byte-identical while its URLs are unchanged
+            files[name] = gzip.compress(render_urlset(chunk).encode('utf-8'), mtime=0)
+            parts.append((f'{base_url}/{name}', max(url[2] for url in chunk)))
+        files['sitemap.xml'] = render_index(parts).encode('utf-8')
+
+    for stale in root.glob('sitemap-*.xml.gz'):
+        if stale.name not in files:
+            stale.unlink()
+    return [name for name, data in files.items() if write_if_changed(root / name, data)]
+
+def generate_sitemap(root=BASE_DIR, base_url=SITE_URL, max_urls=MAX_URLS, today=None):
+    """Regenerate the sitemap for a page tree; returns (url count, files written)"""
+    root = Path(root)
+    base_url = base_url.rstrip('/')
+    today = today or datetime.date.today().isoformat()
+    state = SitemapState(root)
+    urls = collect_urls(root, base_url, state, read_overrides(root / 'sitemap.xml'), today)
+    written = write_sitemaps(root, base_url, urls, max_urls)
+    state.save()
+    return len(urls), written
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--root', type=Path, default=BASE_DIR,
+                        help='page tree to map, e.g. a build or market output directory (default: the site)')
+    parser.add_argument('--base-url', default=SITE_URL, help=f'public URL of the tree root (default: {SITE_URL})')
+    parser.add_argument('--max-urls', type=int, default=MAX_URLS, metavar='N',
+                        help=f'URLs per sitemap file before splitting into gzipped parts (default: {MAX_URLS})')
+    args = parser.parse_args()
+
+    count, written = generate_sitemap(args.root, args.base_url, args.max_urls)
+    print(f"Mapped {count} pages; wrote {', '.join(written) if written else 'nothing (unchanged)'}.")
+
+if __name__ == "__main__":
+    main()
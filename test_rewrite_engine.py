@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Check that the single-pass rewrite engine matches the ordered rule chain on source-market HTML
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+
+from rewrite_engine import LITERAL, REGEX, Rule, RewriteEngine, apply_sequential, build_rules, literal_sources
+from site_tree import find_html_files
+from update_content import BASE_DIR, ENGINE, REWRITE_RULES, source_market_copy
+
+RULES = build_rules(REWRITE_RULES)
+
+# Pre-rebrand copy as it appeared on the source-market pages
+SOURCE_MARKET_SAMPLES = [
+    'We are serving all Staten Island zip codes today.',
+    'Our vans run across all Staten Island zip codes including 10301, 10304 and 10302. Call now.',
+    '<title>Staten Island Ductless Mini Splits | HVAC</title>',
+    '<meta name="description" content="Mini splits in Staten Island and St. George.">',
+    '<meta name="keywords" content="ductless Staten Island, HVAC">',
+    '<h1>Staten Island\'s #1 <span class="hero-highlight">Ductless Mini Split</span> Experts</h1>',
+    '<p>123 Victory Blvd, Staten Island, NY 10301</p>',
+    '<p>&copy; 2024 Staten Island Ductless Mini Splits. All rights reserved.</p>',
+    '<p>- Maria R., St. George</p><p>- John D., Tottenville</p><p>- Sarah L., Great Kills</p>',
+    '<div>Available in St. George, Port Richmond and New Brighton (10301) (10304) (10302)</div>',
+    '<a href="https://facebook.com/statenislandductless">SI Ductless Pro</a> info@statenislandductless.com',
+    'Views of New York Harbor from St. George, serving all Staten Island zip codes.',
+]
+
+def sample_page():
+    """Every sample in one page, the way the rules meet them on a real page"""
+    return '<html><body>\n' + '\n'.join(SOURCE_MARKET_SAMPLES) + '\n</body></html>\n'
+
+def repo_pages():
+    """Every page of the site, as it is and as source-market copy"""
+    pages = []
+    for file_path in find_html_files(BASE_DIR):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        name = Path(file_path).relative_to(BASE_DIR).as_posix()
+        pages.append(pytest.param(content, id=name))
+        pages.append(pytest.param(source_market_copy(content, RULES), id=f'{name}:source-market'))
+    return pages
+
+SAMPLES = SOURCE_MARKET_SAMPLES + [sample_page()] + repo_pages()
+
+@pytest.mark.parametrize('sample', SAMPLES)
+def test_engine_matches_sequential(sample):
+    assert ENGINE.rewrite(sample) == apply_sequential(sample, RULES)
+
+@pytest.mark.parametrize('sample', SAMPLES)
+def test_streaming_matches_sequential(sample):
+    chunks = [sample[i:i + 4096] for i in range(0, len(sample), 4096)]
+    assert ''.join(ENGINE.rewrite_stream(chunks)) == apply_sequential(sample, RULES)
+
+def test_source_market_copy_round_trip():
+    page = sample_page()
+    rebuilt = source_market_copy(apply_sequential(page, RULES), RULES)
+    assert 'Staten Island' in rebuilt
+    assert ENGINE.rewrite(rebuilt) == apply_sequential(rebuilt, RULES)
+
+def test_zip_code_rules_are_shadowed():
+    active = {rule.pattern for rule in ENGINE.active}
+    assert 'serving all Staten Island zip codes' not in active
+    assert r'across all Staten Island zip codes including [^.]*\.' not in active
+
+def test_literal_sources_match_hand_written_patterns():
+    assert 'Staten Island' in literal_sources('Staten Island')
+    assert r'St\. George' in literal_sources('St. George')
+
+def test_escaped_regex_is_shadowed():
+    engine = RewriteEngine([(LITERAL, 'a b', 'c'), (REGEX, r'x a\ b', 'y')])
+    assert [rule.pattern for rule in engine.active] == ['a b']
+
+def test_rule_flags_are_scoped():
+    rules = [(REGEX, 'abc', 'X', re.IGNORECASE), (REGEX, '^d', 'Y', re.MULTILINE), (LITERAL, 'abc', 'Z')]
+    sample = 'ABC abc\nd d'
+    assert RewriteEngine(rules).rewrite(sample) == apply_sequential(sample, build_rules(rules)) == 'X X\nY d'
+
+def test_unsupported_flags_are_rejected():
+    with pytest.raises(ValueError):
+        Rule(REGEX, 'abc', 'X', re.DEBUG)
+
+def test_dispatch_miss_falls_back_to_every_rule():
+    engine = RewriteEngine([(LITERAL, 'ab', 'X'), (REGEX, 'c(d)', r'\1')])
+    engine._dispatch, engine._wildcard = {}, []
+    assert engine.rewrite('ab cd') == 'X d'
+
+def test_unmatched_rule_raises():
+    engine = RewriteEngine([(LITERAL, 'ab', 'X')])
+    engine.matcher = re.compile('cd')
+    with pytest.raises(RuntimeError):
+        engine.rewrite('cd')
@@ -3,10 +3,23 @@
 Script to update all HTML files for Belpre, OH location
 """
 
+import argparse
+import hashlib
 import os
-import re
+import sys
 from pathlib import Path
 
+import json_ld
+import rewrite_engine
+import site_data
+import site_tree
+from build_cache import CACHE_FILENAME, BuildCache, content_digest, module_source, rules_hash
+from file_jobs import ERROR, UNCHANGED, UPDATED, add_jobs_argument, map_files
+from json_ld import page_profile, rewrite_json_ld, rewrite_json_ld_stream
+from rewrite_engine import (LITERAL, REGEX, STREAM_THRESHOLD, RewriteEngine, apply_sequential, build_rules,
+                            read_chunks, rewrite_file_streaming)
+from rule_profile import RuleProfiler, add_profile_arguments, finish_profile
+
 # Configuration
 CATEGORY = "Ductless Mini Split"
 CITY = "Belpre"
@@ -16,176 +29,250 @@ FULL_LOCATION = "Belpre, OH"
 # Base directory
 BASE_DIR = Path(__file__).parent
 
-def update_file_content(file_path):
-    """Update content in a single HTML file"""
+# Ordered rewrite rules, applied exactly like the original re.sub/str.replace chain.
+# Schema addresses and coordinates are set by the JSON-LD stage (json_ld.py).
+REWRITE_RULES = [
+    # Update title tags
+    (REGEX, r'<title>([^<]*Staten Island[^<]*)</title>',
+     f'<title>{FULL_LOCATION} Ductless Mini Splits | Professional HVAC Services</title>'),
+
+    # Update meta descriptions
+    (REGEX, r'<meta name="description" content="([^"]*Staten Island[^"]*)"',
+     f'<meta name="description" content="Professional ductless mini split installation, repair, and maintenance in {FULL_LOCATION}. 24/7 emergency HVAC services. Expert technicians."'),
+
+    # Update meta keywords
+    (REGEX, r'<meta name="keywords" content="([^"]*Staten Island[^"]*)"',
+     f'<meta name="keywords" content="ductless mini splits {FULL_LOCATION}, HVAC services, air conditioning repair, heating installation, emergency HVAC"'),
+
+    # Update business name references
+    (LITERAL, 'Staten Island Ductless Mini Splits', f'{FULL_LOCATION} Ductless Mini Splits'),
+    (LITERAL, 'SI Ductless Pro', f'{CITY} Ductless Pro'),
+
+    # Update main headings
+    (REGEX, r'Staten Island\'s #1 <span class="hero-highlight">([^<]*)</span> Experts',
+     f'{CITY}\'s #1 <span class="hero-highlight">\\1</span> Experts'),
+
+    # Update service area references
+    (LITERAL, 'Staten Island', FULL_LOCATION),
+    (LITERAL, 'New York Harbor', 'Ohio River'),
+    (LITERAL, 'St. George', CITY),
+    (LITERAL, 'Tottenville', 'Marietta'),
+    (LITERAL, 'Great Kills', 'Little Hocking'),
+    (LITERAL, 'Port Richmond', 'Vincent'),
+    (LITERAL, 'New Brighton', 'Parkersburg, WV'),
+
+    # Update zip codes and locations in footer and content
+    (REGEX, r'\(10301\)', '(45714)'),
+    (REGEX, r'\(10304\)', '(45750)'),
+    (REGEX, r'\(10302\)', '(45742)'),
+
+    # Update email addresses
+    (LITERAL, 'info@statenislandductless.com', 'info@belpreductless.com'),
+
+    # Update social media links
+    (LITERAL, 'facebook.com/statenislandductless', 'facebook.com/belpreductless'),
+    (LITERAL, 'instagram.com/statenislandductless', 'instagram.com/belpreductless'),
+
+    # Update URLs
+    (LITERAL, 'statenislandductless.com', 'belpreductless.com'),
+
+    # Update address in footer
+    (LITERAL, '123 Victory Blvd, Staten Island, NY 10301', f'123 Main St, {FULL_LOCATION} 45714'),
+
+    # Update copyright
+    (LITERAL, 'Staten Island Ductless Mini Splits. All rights reserved.', f'{FULL_LOCATION} Ductless Mini Splits. All rights reserved.'),
+
+    # Update customer reviews
+    (LITERAL, '- Maria R., St. George', f'- Maria R., {CITY}'),
+    (LITERAL, '- John D., Tottenville', '- John D., Marietta'),
+    (LITERAL, '- Sarah L., Great Kills', '- Sarah L., Little Hocking'),
+
+    # Update emergency banner
+    (LITERAL, 'Available in St. George', f'Available in {CITY}'),
+
+    # Update specific location references in content
+    (REGEX, r'serving all Staten Island zip codes',
+     f'serving {FULL_LOCATION} and surrounding Washington County areas'),
+
+    # Update location-specific content
+    (REGEX, r'across all Staten Island zip codes including [^.]*\.',
+     f'throughout the {FULL_LOCATION} area and surrounding Washington County communities.'),
+]
+
+# Compiled once; rewrites each page in a single scan
+ENGINE = RewriteEngine(REWRITE_RULES)
+
+# Cached results are only reused while the rules and the engine are unchanged
+RULESET_HASH = rules_hash(REWRITE_RULES, module_source(rewrite_engine), module_source(json_ld),
+                          module_source(site_data))
+
+def rewrite_content(content, file_path, warnings=None):
+    """Update the page's JSON-LD blocks from its profile, then run the rule engine"""
+    return ENGINE.rewrite(rewrite_json_ld(content, page_profile(file_path), warnings))
+
+def with_warnings(message, file_path, warnings):
+    """A result message followed by one line per warning"""
+    return ''.join([message] + [f"\nWarning: {file_path}: {warning}" for warning in warnings])
+
+def rewrite_file(file_path, known_digest=None, stream=False, profiler=None):
+    """Rewrite a single HTML file and return (status, message, digest) without printing
+
+    When known_digest matches the file's content hash the rewrite is skipped.
+    Large files, or every file when stream is set, are rewritten in chunks.
+    With a profiler the rules run one at a time over the whole file so each
+    rule's cost can be measured; the result is the same. A JSON-LD block that
+    cannot be rewritten is left as it is and reported as a warning.
+    """
+    warnings = []
     try:
+        if profiler is None and (stream or os.path.getsize(file_path) > STREAM_THRESHOLD):
+            return rewrite_large_file(file_path, known_digest)
+        
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        original_content = content
-        
-        # Update title tags
-        content = re.sub(
-            r'<title>([^<]*Staten Island[^<]*)</title>',
-            f'<title>{FULL_LOCATION} Ductless Mini Splits | Professional HVAC Services</title>',
-            content
-        )
-        
-        # Update meta descriptions
-        content = re.sub(
-            r'<meta name="description" content="([^"]*Staten Island[^"]*)"',
-            f'<meta name="description" content="Professional ductless mini split installation, repair, and maintenance in {FULL_LOCATION}. 24/7 emergency HVAC services. Expert technicians."',
-            content
-        )
-        
-        # Update meta keywords
-        content = re.sub(
-            r'<meta name="keywords" content="([^"]*Staten Island[^"]*)"',
-            f'<meta name="keywords" content="ductless mini splits {FULL_LOCATION}, HVAC services, air conditioning repair, heating installation, emergency HVAC"',
-            content
-        )
-        
-        # Update business name references
-        content = content.replace('Staten Island Ductless Mini Splits', f'{FULL_LOCATION} Ductless Mini Splits')
-        content = content.replace('SI Ductless Pro', f'{CITY} Ductless Pro')
-        
-        # Update addresses
-        content = re.sub(
-            r'"streetAddress": "123 Victory Blvd"',
-            '"streetAddress": "123 Main St"',
-            content
-        )
-        content = re.sub(
-            r'"addressLocality": "Staten Island"',
-            f'"addressLocality": "{CITY}"',
-            content
-        )
-        content = re.sub(
-            r'"addressRegion": "NY"',
-            f'"addressRegion": "{STATE}"',
-            content
-        )
-        content = re.sub(
-            r'"postalCode": "10301"',
-            '"postalCode": "45714"',
-            content
-        )
-        
-        # Update coordinates
-        content = re.sub(
-            r'"latitude": 40\.6282',
-            '"latitude": 39.2742',
-            content
-        )
-        content = re.sub(
-            r'"longitude": -74\.0776',
-            '"longitude": -81.5734',
-            content
-        )
-        
-        # Update main headings
-        content = re.sub(
-            r'Staten Island\'s #1 <span class="hero-highlight">([^<]*)</span> Experts',
-            f'{CITY}\'s #1 <span class="hero-highlight">\\1</span> Experts',
-            content
-        )
+        digest = content_digest(content)
+        if digest == known_digest:
+            return UNCHANGED, f"No changes needed: {file_path}", digest
         
-        # Update service area references
-        content = content.replace('Staten Island', FULL_LOCATION)
-        content = content.replace('New York Harbor', 'Ohio River')
-        content = content.replace('St. George', CITY)
-        content = content.replace('Tottenville', 'Marietta')
-        content = content.replace('Great Kills', 'Little Hocking')
-        content = content.replace('Port Richmond', 'Vincent')
-        content = content.replace('New Brighton', 'Parkersburg, WV')
-        
-        # Update zip codes and locations in footer and content
-        content = re.sub(
-            r'\(10301\)',
-            '(45714)',
-            content
-        )
-        content = re.sub(
-            r'\(10304\)',
-            '(45750)',
-            content
-        )
-        content = re.sub(
-            r'\(10302\)',
-            '(45742)',
-            content
-        )
-        
-        # Update email addresses
-        content = content.replace('info@statenislandductless.com', 'info@belpreductless.com')
-        
-        # Update social media links
-        content = content.replace('facebook.com/statenislandductless', 'facebook.com/belpreductless')
-        content = content.replace('instagram.com/statenislandductless', 'instagram.com/belpreductless')
-        
-        # Update URLs
-        content = content.replace('statenislandductless.com', 'belpreductless.com')
-        
-        # Update address in footer
-        content = content.replace('123 Victory Blvd, Staten Island, NY 10301', f'123 Main St, {FULL_LOCATION} 45714')
-        
-        # Update copyright
-        content = content.replace('Staten Island Ductless Mini Splits. All rights reserved.', f'{FULL_LOCATION} Ductless Mini Splits. All rights reserved.')
-        
-        # Update customer reviews
-        content = content.replace('- Maria R., St. George', f'- Maria R., {CITY}')
-        content = content.replace('- John D., Tottenville', '- John D., Marietta')
-        content = content.replace('- Sarah L., Great Kills', '- Sarah L., Little Hocking')
-        
-        # Update emergency banner
-        content = content.replace('Available in St. George', f'Available in {CITY}')
-        
-        # Update specific location references in content
-        content = re.sub(
-            r'serving all Staten Island zip codes',
-            f'serving {FULL_LOCATION} and surrounding Washington County areas',
-            content
-        )
-        
-        # Update location-specific content
-        content = re.sub(
-            r'across all Staten Island zip codes including [^.]*\.',
-            f'throughout the {FULL_LOCATION} area and surrounding Washington County communities.',
-            content
-        )
+        original_content = content
+        if profiler is None:
+            content = rewrite_content(content, file_path, warnings)
+        else:
+            profile = page_profile(file_path)
+            content = profiler.call('update_content', 'rewrite_json_ld',
+                                    lambda text: rewrite_json_ld(text, profile, warnings), content, file_path)
+            content = profiler.apply_rules('update_content', ENGINE.rules, content, file_path)
         
         # Only write if content changed
         if content != original_content:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
-            print(f"Updated: {file_path}")
-            return True
+            return UPDATED, with_warnings(f"Updated: {file_path}", file_path, warnings), content_digest(content)
         else:
-            print(f"No changes needed: {file_path}")
-            return False
+            return UNCHANGED, with_warnings(f"No changes needed: {file_path}", file_path, warnings), digest
             
     except Exception as e:
-        print(f"Error updating {file_path}: {e}")
-        return False
+        return ERROR, f"Error updating {file_path}: {e}", None
+
+def rewrite_large_file(file_path, known_digest=None):
+    """Streaming variant of rewrite_file with memory bounded by the chunk size"""
+    if known_digest is not None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            digest = hashlib.sha256()
+            for chunk in read_chunks(f):
+                digest.update(chunk.encode('utf-8'))
+        if digest.hexdigest() == known_digest:
+            return UNCHANGED, f"No changes needed: {file_path}", known_digest
+    
+    profile = page_profile(file_path)
+    warnings = []
+    changed, digest = rewrite_file_streaming(
+        file_path, lambda chunks: ENGINE.rewrite_stream(rewrite_json_ld_stream(chunks, profile, warnings))
+    )
+    if changed:
+        return UPDATED, with_warnings(f"Updated: {file_path}", file_path, warnings), digest
+    return UNCHANGED, with_warnings(f"No changes needed: {file_path}", file_path, warnings), digest
+
+def rewrite_job(job):
+    """Process-pool entry point for a (file_path, known_digest, stream) job"""
+    return rewrite_file(*job)
+
+def update_file_content(file_path):
+    """Update content in a single HTML file"""
+    status, message, digest = rewrite_file(file_path)
+    print(message)
+    return status == UPDATED
+
+def find_html_files():
+    """Find all HTML files under the base directory"""
+    return site_tree.find_html_files(BASE_DIR)
+
+def source_market_copy(content, rules):
+    """Undo the literal rules to recreate source-market text
+
+    Longer replacements are undone first, so 'Belpre, OH' turns back into
+    'Staten Island' before the bare 'Belpre' can become 'St. George'.
+    """
+    literals = [rule for rule in rules if rule.kind == LITERAL and rule.replacement]
+    for rule in sorted(literals, key=lambda rule: len(rule.replacement), reverse=True):
+        content = content.replace(rule.replacement, rule.pattern)
+    return content
+
+def verify_engine(html_files):
+    """Check that the single-pass engine matches the ordered chain on every file"""
+    rules = build_rules(REWRITE_RULES)
+    mismatches = 0
+    for file_path in html_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for sample in (content, source_market_copy(content, rules)):
+            if ENGINE.rewrite(sample) != apply_sequential(sample, rules):
+                print(f"Mismatch: {file_path}")
+                mismatches += 1
+                break
+    print(f"Verified {len(html_files)} files, {mismatches} mismatches.")
+    return mismatches == 0
 
 def main():
     """Main function to update all HTML files"""
-    html_files = []
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--verify', action='store_true',
+                        help='compare the single-pass engine with the ordered rule chain and exit')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'ignore and do not update {CACHE_FILENAME}')
+    parser.add_argument('--stream', action='store_true',
+                        help='rewrite every file in chunks with bounded memory (always on for large files)')
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
     
-    # Find all HTML files
-    for root, dirs, files in os.walk(BASE_DIR):
-        for file in files:
-            if file.endswith('.html'):
-                html_files.append(os.path.join(root, file))
+    html_files = find_html_files()
+    
+    if args.verify:
+        sys.exit(0 if verify_engine(html_files) else 1)
     
     print(f"Found {len(html_files)} HTML files to update")
     
-    updated_count = 0
+    cache = None if args.no_cache else BuildCache(BASE_DIR, RULESET_HASH)
+    profiler = RuleProfiler() if args.profile else None
+    jobs = []
+    skipped_count = 0
     for file_path in html_files:
-        if update_file_content(file_path):
+        # A profile covers every file, so the cache is only updated, not consulted
+        if cache and not profiler and cache.is_fresh(file_path):
+            skipped_count += 1
+        else:
+            jobs.append((file_path, cache.digest(file_path) if cache else None, args.stream))
+    
+    updated_count = 0
+    error_count = 0
+    if profiler is not None:
+        results = (rewrite_file(file_path, None, False, profiler) for file_path, _, _ in jobs)
+    else:
+        results = map_files(rewrite_job, jobs, args.jobs)
+    for (file_path, _, _), (status, message, digest) in zip(jobs, results):
+        print(message)
+        if status == UPDATED:
             updated_count += 1
+        elif status == ERROR:
+            error_count += 1
+        if cache:
+            if status == ERROR:
+                cache.forget(file_path)
+            else:
+                cache.record(file_path, digest)
+    
+    if cache:
+        cache.prune(html_files)
+        cache.save()
     
     print(f"\nCompleted! Updated {updated_count} files out of {len(html_files)} total files.")
+    if skipped_count:
+        print(f"Skipped {skipped_count} files unchanged since the last run.")
+    if error_count:
+        print(f"{error_count} files could not be updated.")
+    finish_profile(profiler, args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Watch the site tree for edited pages, with inotify on Linux and polling elsewhere
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from site_tree import EXCLUDED_DIRS, find_html_files
+
+# inotify event bits (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+EVENT_HEADER = struct.Struct('iIII')
+
+# Quiet period that ends a burst of saves, and the polling fallback's scan interval
+DEFAULT_DEBOUNCE = 0.03
+DEFAULT_POLL_INTERVAL = 0.05
+
+def is_watched_dir(name):
+    """Whether a directory can hold site pages"""
+    return name not in EXCLUDED_DIRS and not name.startswith('.')
+
+def file_signature(file_path):
+    """(mtime_ns, size) of a file, or None if it is gone"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class InotifyWatcher:
+    """Report written or renamed-in HTML files under base_dir using inotify"""
+
+    def __init__(self, base_dir):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.base_dir = str(base_dir)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self.add_tree(self.base_dir)
+
+    def add_tree(self, top):
+        """Watch top and every page directory below it"""
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if is_watched_dir(d)]
+            wd = self._add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = root
+
+    def read(self, timeout):
+        """Changed HTML paths seen within timeout seconds; None means rescan everything"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            root = self.dirs.get(wd)
+            if root is None or not name:
+                continue
+            path = os.path.join(root, name)
+            if mask & IN_ISDIR:
+                if is_watched_dir(name):
+                    self.add_tree(path)
+                    changed.update(find_html_files(path))
+            elif name.endswith('.html') and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Report changed HTML files under base_dir by rescanning their signatures"""
+
+    def __init__(self, base_dir, interval=DEFAULT_POLL_INTERVAL):
+        self.base_dir = base_dir
+        self.interval = interval
+        self.signatures = self.scan()
+
+    def scan(self):
+        return {file_path: file_signature(file_path) for file_path in find_html_files(self.base_dir)}
+
+    def read(self, timeout):
+        """Changed HTML paths found by the next scan within timeout seconds"""
+        time.sleep(min(timeout, self.interval) if timeout is not None else self.interval)
+        signatures = self.scan()
+        changed = {path for path, signature in signatures.items() if self.signatures.get(path) != signature}
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(base_dir, polling=False):
+    """An inotify watcher where available, else a polling one"""
+    if not polling and hasattr(select, 'select'):
+        try:
+            return InotifyWatcher(base_dir)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(base_dir)
+
+def watch(base_dir, handle, debounce=DEFAULT_DEBOUNCE, polling=False):
+    """Call handle(paths) for each debounced burst of changed pages until interrupted
+
+    handle returns the paths it wrote itself. Their signatures are remembered
+    so the events caused by those writes do not trigger another round.
+    """
+    watcher = open_watcher(base_dir, polling)
+    own_writes = {}
+    try:
+        while True:
+            pending = watcher.read(None)
+            if pending is None:
+                pending = set(find_html_files(base_dir))
+            # Keep collecting until the burst has been quiet for debounce seconds
+            while pending:
+                more = watcher.read(debounce)
+                if more is None:
+                    more = set(find_html_files(base_dir))
+                if not more:
+                    break
+                pending |= more
+
+            paths = []
+            for path in sorted(pending):
+                signature = file_signature(path)
+                if signature is None:
+                    continue
+                if own_writes.pop(path, None) == signature:
+                    continue
+                paths.append(path)
+            if not paths:
+                continue
+
+            for path in handle(paths):
+                own_writes[path] = file_signature(path)
+    finally:
+        watcher.close()